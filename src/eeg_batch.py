@@ -0,0 +1,77 @@
+# eeg_batch.py
+"""
+Headless batch analysis of recorded BrainFlow CSV sessions (no display or Qt required).
+"""
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from brainflow.board_shim import BoardShim
+from modules.batch import analyze_file, output_path
+from modules.epochs import MarkerEvents, schedule_from_metadata
+from modules.filters import DEFAULT_FILTERS
+from modules.montage import Montage
+from modules.recording import find_metadata_file, parse_metadata
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+', help='BrainFlow CSV recordings')
+    parser.add_argument('--board-id', type=int, default=17, help='BrainFlow board ID the files were recorded with')
+    parser.add_argument('--sampling-rate', type=int, default=None, help='Override the board sampling rate')
+    parser.add_argument('--out-dir', type=str, default=None, help='Output directory (default: next to each input)')
+    parser.add_argument('--format', choices=['npz', 'csv'], default='npz', help='Columnar output format')
+    parser.add_argument('--epoch', type=float, default=4.0, help='Epoch length in seconds')
+    parser.add_argument('--chunk', type=float, default=60.0, help='Seconds of data read per chunk')
+    parser.add_argument('--filters', type=str, default=','.join(k for k, v in DEFAULT_FILTERS.items() if v),
+                        help=f"Comma-separated filters to enable ({', '.join(DEFAULT_FILTERS)})")
+    parser.add_argument('--bandpass', type=float, nargs=2, default=(3.0, 333.0), metavar=('LOW', 'HIGH'))
+    parser.add_argument('--montage', type=str, default=None,
+                        help='Montage JSON (default: first eight inputs plus C3–C4, see montages/)')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of files processed in parallel')
+    parser.add_argument('--events', choices=['none', 'metadata', 'markers'], default='none',
+                        help='Also average ON/OFF (metadata schedule) or marker-locked epochs per condition')
+    parser.add_argument('--metadata', type=str, default=None,
+                        help='Metadata sidecar for --events metadata (default: <session prefix>_metadata.txt)')
+    parser.add_argument('--marker-epoch', type=float, default=5.0, help='Epoch length after each marker in seconds')
+    args = parser.parse_args()
+
+    requested = [f for f in args.filters.split(',') if f]
+    unknown = set(requested) - set(DEFAULT_FILTERS)
+    if unknown:
+        parser.error(f"unknown filters: {', '.join(sorted(unknown))}")
+    enabled = {key: key in requested for key in DEFAULT_FILTERS}
+
+    sampling_rate = args.sampling_rate or BoardShim.get_sampling_rate(args.board_id)
+    exg_channels = BoardShim.get_exg_channels(args.board_id)
+    montage = Montage.load(args.montage, exg_channels) if args.montage else Montage.default(exg_channels)
+
+    jobs = []
+    for path in args.files:
+        events = None
+        if args.events == 'metadata':
+            metadata_path = args.metadata or find_metadata_file(path)
+            if metadata_path is None:
+                parser.error(f"no metadata sidecar found for {path}")
+            with open(metadata_path, encoding='utf-8', errors='replace') as f:
+                events = schedule_from_metadata(parse_metadata(f.read()))
+        elif args.events == 'markers':
+            events = MarkerEvents(BoardShim.get_marker_channel(args.board_id), args.marker_epoch)
+        jobs.append((path, output_path(path, args.out_dir, args.format), sampling_rate, montage, args.epoch,
+                     args.chunk, enabled, tuple(args.bandpass), events,
+                     output_path(path, args.out_dir, args.format, 'epochs')))
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(analyze_file, *zip(*jobs)))
+    else:
+        results = [analyze_file(*job) for job in jobs]
+
+    for out_path, num_epochs in results:
+        logging.info("Wrote %d epochs to %s", num_epochs, out_path)
+
+
+if __name__ == '__main__':
+    main()
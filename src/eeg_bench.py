@@ -0,0 +1,61 @@
+# eeg_bench.py
+"""
+Headless benchmark of the signal pipeline on synthetic EEG, with baselines to compare runs against.
+"""
+import argparse
+import logging
+import sys
+
+from modules.benchmark import CHANNELS, SAMPLING_RATES, STAGES, WINDOWS, compare, load, run_suite, save
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--channels', type=int, nargs='+', default=CHANNELS, help='Channel counts')
+    parser.add_argument('--rates', type=int, nargs='+', default=SAMPLING_RATES, help='Sampling rates in Hz')
+    parser.add_argument('--windows', type=float, nargs='+', default=WINDOWS, help='Window lengths in seconds')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to time')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds spent timing each stage')
+    parser.add_argument('--quick', action='store_true', help='8 and 32 channels at 512 Hz with a 4 s window only')
+    parser.add_argument('--out', type=str, default=None, help='Write the results (JSON) to this file')
+    parser.add_argument('--compare', type=str, default=None, help='Baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative slowdown of a median that counts as a regression (default 0.2 = 20%%)')
+    args = parser.parse_args()
+
+    if args.quick:
+        args.channels, args.rates, args.windows = [8, 32], [512], [4.0]
+
+    def progress(result):
+        stages = result['stages']
+        logging.info("%3d ch %5d Hz %5.1f s | %s", result['channels'], result['sampling_rate'], result['window_s'],
+                     " | ".join(f"{k} {v['median_ms']:.2f} ms" for k, v in stages.items()))
+
+    report = run_suite(args.channels, args.rates, args.windows, args.stages, args.min_time, progress)
+    if 'tick' in args.stages:
+        for result in report['results']:
+            tick = result['stages']['tick']
+            logging.info("%3d ch %5d Hz %5.1f s | tick %.2f ms (p95 %.2f), %.2f Msamples/s, %.1fx real time",
+                         result['channels'], result['sampling_rate'], result['window_s'], tick['median_ms'],
+                         tick['p95_ms'], tick['msamples_per_s'], report['tick_s'] * 1000.0 / tick['median_ms'])
+    if args.out:
+        save(report, args.out)
+        logging.info("Wrote %s", args.out)
+
+    if args.compare:
+        rows = compare(report, load(args.compare), args.threshold)
+        regressions = [row for row in rows if row[5]]
+        for (channels, rate, window), stage, old, new, ratio, regressed in rows:
+            if regressed or ratio < 1.0 - args.threshold:
+                logging.info("%s %3d ch %5d Hz %5.1f s %-16s %8.2f -> %8.2f ms (%.2fx)",
+                             'SLOWER' if regressed else 'faster', channels, rate, window, stage, old, new, ratio)
+        logging.info("%d of %d stage timings regressed by more than %.0f%%", len(regressions), len(rows),
+                     args.threshold * 100)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# eeg_convert.py
+"""
+Converts BrainFlow CSV recordings and .eegstream sessions to the memory-mapped .eegbin format.
+"""
+import argparse
+import logging
+import os
+
+from brainflow.board_shim import BoardShim
+from modules.recording import convert_csv, find_metadata_file
+from modules.stream_recording import convert_stream, segment_files
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+',
+                        help='BrainFlow CSV recordings or .eegstream files (any segment of a rotated session)')
+    parser.add_argument('--board-id', type=int, default=17, help='BrainFlow board ID the files were recorded with')
+    parser.add_argument('--sampling-rate', type=int, default=None, help='Override the board sampling rate')
+    parser.add_argument('--metadata', type=str, default=None,
+                        help='Metadata sidecar (default: <session prefix>_metadata.txt next to the CSV)')
+    parser.add_argument('--out-dir', type=str, default=None, help='Output directory (default: next to each input)')
+    args = parser.parse_args()
+
+    sampling_rate = args.sampling_rate or BoardShim.get_sampling_rate(args.board_id)
+    board_descr = BoardShim.get_board_descr(args.board_id)
+    converted = set()
+    for path in args.files:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        out_path = os.path.join(args.out_dir or os.path.dirname(path) or '.', stem + '.eegbin')
+        if path.endswith('.eegstream'):
+            segments = segment_files(path)
+            if tuple(segments) in converted:
+                continue  # another segment of an already converted session
+            converted.add(tuple(segments))
+            if len(segments) > 1:
+                out_path = os.path.join(os.path.dirname(out_path), stem.rpartition('_')[0] + '.eegbin')
+            _, gaps = convert_stream(segments, out_path)
+            logging.info("Wrote %s from %d segment(s), %d gap(s)", out_path, len(segments), gaps)
+            continue
+        metadata = args.metadata or find_metadata_file(path)
+        convert_csv(path, out_path, sampling_rate, args.board_id, board_descr, metadata)
+        logging.info("Wrote %s (metadata: %s)", out_path, metadata or "none")
+
+
+if __name__ == '__main__':
+    main()
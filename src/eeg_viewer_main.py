@@ -2,13 +2,35 @@
 """
 Main entry point for EEG Viewer Application using BrainFlow and PyQt5.
 """
+import time
+_START = time.perf_counter()  # before the heavy imports below, for the startup report
+
 import argparse
 import logging
 from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds
 from modules.controller import GraphController
+from modules.multiboard import AcquisitionSource, MultiBoard
+from modules.playback import PlaybackBoard
+from modules.profiling import STARTUP
+from modules.recording import BinaryRecorder, RecordingReader, find_metadata_file
+from modules.scheduler import AdaptiveScheduler
+from modules.spectrogram import SpectrogramSettings
+from modules.stream_recording import StreamRecorder
+
+
+def open_extra_board(spec):
+    # "BOARD_ID", "BOARD_ID:SERIAL_PORT" or a .eegbin recording (played back in real time).
+    if spec.endswith('.eegbin'):
+        return PlaybackBoard(RecordingReader(spec))
+    board_id, _, serial_port = spec.partition(':')
+    params = BrainFlowInputParams()
+    params.serial_port = serial_port
+    return BoardShim(int(board_id), params)
 
 
 def main():
+    STARTUP.reset(_START)
+    STARTUP.mark('imports')
     BoardShim.enable_dev_board_logger()
     logging.basicConfig(level=logging.DEBUG)
 
@@ -16,30 +38,107 @@ def main():
     parser.add_argument('--serial-port', type=str, default='COM5', help='Serial port for real board')
     parser.add_argument('--board-id', type=int, default=17, help='BrainFlow board ID')
     parser.add_argument('--streamer-params', type=str, default='', help='Optional streamer parameters')
-    parser.add_argument('--playback-file', type=str, default=None, help='Path to CSV file for playback mode')
+    parser.add_argument('--playback-file', type=str, default=None,
+                        help='Path to CSV (BrainFlow playback) or .eegbin (seekable playback) file')
+    parser.add_argument('--speed', type=float, default=1.0, help='Playback speed for .eegbin files')
+    parser.add_argument('--window', type=float, default=4, help='Length of the displayed/analysed window in seconds')
+    parser.add_argument('--record', type=str, default=None,
+                        help='Record incoming data to this .eegbin file, or continuously (background writer, '
+                             'crash-safe) to an .eegstream file')
+    parser.add_argument('--compress', action='store_true', help='zlib-compress .eegstream blocks')
+    parser.add_argument('--rotate-minutes', type=float, default=None,
+                        help='Start a new .eegstream segment (name_000.eegstream, ...) every N minutes')
+    parser.add_argument('--rotate-mb', type=float, default=None, help='Start a new .eegstream segment every N MB')
+    parser.add_argument('--montage', type=str, default=None,
+                        help='Montage JSON (default: first eight inputs plus C3–C4, see montages/)')
+    parser.add_argument('--layout', choices=['auto', 'separate', 'stacked'], default='auto',
+                        help='One plot per channel, or all channels on one stacked canvas (auto: by channel count)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Show rolling per-stage timings (p50/p95/max), late ticks and board backlog')
+    parser.add_argument('--profile-log', type=str, default=None,
+                        help='Append a profiling summary (JSON line) to this file every 10 s and on exit')
+    parser.add_argument('--fps', type=float, default=30, help='Target trace refresh rate')
+    parser.add_argument('--metrics-ms', type=int, default=250,
+                        help='Target interval in ms at which every channel\'s quality/spectral metrics are refreshed')
+    parser.add_argument('--fixed-rate', action='store_true',
+                        help='Keep the refresh rates even when ticks exceed their time budget')
+    parser.add_argument('--spectrogram', nargs='+', default=None, metavar='CHANNEL',
+                        help='Show a scrolling spectrogram for these montage channels (names or 1-based positions)')
+    parser.add_argument('--spectrogram-range', nargs=2, type=float, default=(1.0, 60.0), metavar=('LOW', 'HIGH'),
+                        help='Spectrogram frequency range in Hz')
+    parser.add_argument('--spectrogram-minutes', type=float, default=5, help='Spectrogram history length')
+    parser.add_argument('--spectrogram-hop', type=float, default=0.25, help='Seconds between spectrogram columns')
+    parser.add_argument('--extra-board', action='append', default=[], metavar='SPEC',
+                        help='Acquire another board alongside the main one, resampled onto its clock: BOARD_ID, '
+                             'BOARD_ID:SERIAL_PORT or a .eegbin file (repeatable; -1 is BrainFlow\'s synthetic board)')
+    parser.add_argument('--publish', type=str, default=None, metavar='ADDRESS',
+                        help='Serve filtered blocks, PSDs and metrics to local clients on PORT, HOST:PORT or a '
+                             'Unix socket path')
+    parser.add_argument('--metadata', type=str, default=None, help='Metadata sidecar stored in the recording header')
     args = parser.parse_args()
 
     params = BrainFlowInputParams()
-    if args.playback_file:
-        logging.info("Playback mode activated with file: %s", args.playback_file)
-        params.file = args.playback_file
-        params.master_board = args.board_id
-        board_id = BoardIds.PLAYBACK_FILE_BOARD.value
+    if args.playback_file and args.playback_file.endswith('.eegbin'):
+        logging.info("Seekable playback of %s at %.1fx", args.playback_file, args.speed)
+        reader = RecordingReader(args.playback_file)
+        args.board_id = reader.board_id
+        board_shim = PlaybackBoard(reader, args.speed, preroll_seconds=args.window + 2)
     else:
-        params.serial_port = args.serial_port
-        board_id = args.board_id
+        if args.playback_file:
+            logging.info("Playback mode activated with file: %s", args.playback_file)
+            params.file = args.playback_file
+            params.master_board = args.board_id
+            board_id = BoardIds.PLAYBACK_FILE_BOARD.value
+        else:
+            params.serial_port = args.serial_port
+            board_id = args.board_id
+        board_shim = BoardShim(board_id, params)
+    if args.extra_board:
+        sources = [AcquisitionSource(board_shim, 'main')]
+        sources += [AcquisitionSource(open_extra_board(spec), spec) for spec in args.extra_board]
+        board_shim = MultiBoard(sources)
+        logging.info("Acquiring %d boards, %d rows in total", len(sources), board_shim.num_rows)
+
+    recorder = None
+    if args.record:
+        metadata = args.metadata or (find_metadata_file(args.playback_file) if args.playback_file else None)
+        num_rows = getattr(board_shim, 'num_rows', None) or BoardShim.get_num_rows(args.board_id)
+        board_descr = getattr(board_shim, 'board_descr', None) or BoardShim.get_board_descr(args.board_id)
+        recorder_args = (args.record, BoardShim.get_sampling_rate(args.board_id), num_rows, args.board_id,
+                         board_descr, metadata)
+        if args.record.endswith('.eegstream'):
+            recorder = StreamRecorder(
+                *recorder_args, compression='zlib' if args.compress else 'none',
+                rotate_seconds=args.rotate_minutes * 60 if args.rotate_minutes else None,
+                rotate_bytes=int(args.rotate_mb * 1e6) if args.rotate_mb else None
+            )
+        else:
+            recorder = BinaryRecorder(*recorder_args)
 
-    board_shim = BoardShim(board_id, params)
+    publisher = None
+    if args.publish:
+        from modules.publisher import StreamPublisher  # asyncio is only loaded when publishing
+        publisher = StreamPublisher(args.publish)
 
     try:
         board_shim.prepare_session()
         board_shim.start_stream(450000, args.streamer_params)
+        STARTUP.mark('board')
         #GraphController(board_shim)
-        controller = GraphController(board_shim)
+        scheduler = AdaptiveScheduler(int(round(1000.0 / args.fps)), args.metrics_ms, adaptive=not args.fixed_rate)
+        spectrogram = SpectrogramSettings(args.spectrogram, tuple(args.spectrogram_range),
+                                          args.spectrogram_minutes * 60, args.spectrogram_hop) \
+            if args.spectrogram else None
+        controller = GraphController(board_shim, args.window, recorder, args.montage, args.layout,
+                                     args.profile, args.profile_log, scheduler, spectrogram, publisher)
         controller.run()
     except Exception:
         logging.warning('Exception occurred during session', exc_info=True)
     finally:
+        if recorder is not None:
+            recorder.close()
+        if publisher is not None:
+            publisher.close()
         if board_shim.is_prepared():
             board_shim.release_session()
 
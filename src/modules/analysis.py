@@ -0,0 +1,66 @@
+# analysis.py
+"""
+Per-window signal-quality and spectral metrics, shared by the live viewer and headless analysis.
+"""
+import numpy as np
+
+from modules.spectral import SpectralEngine
+
+CHANNEL_MAPPING = {1: "T7", 2: "T8", 3: "C3", 4: "C4", 5: "FC3", 6: "FC4", 7: "CP3", 8: "CP4"}
+
+
+def classify_quality(ptp, rms, flat, k):
+    if ptp < 10 or flat > 0.95:
+        return "FLAT", "gray"
+    if ptp > 1000:
+        return "NOISY", "red"
+    if rms > 100:
+        return "HIGH RMS", "darkgreen"
+    if k > 10:
+        return "SPIKY", "orange"
+    return "OK", "green"
+
+
+def quality_metrics(ptp, rms, dc, flat, k, s):
+    status, color = classify_quality(ptp, rms, flat, k)
+    return {'ptp': ptp, 'rms': rms, 'dc': dc, 'flat': flat, 'kurtosis': k, 'skew': s,
+            'status': status, 'color': color}
+
+
+def classify_spectrum(entropy):
+    if 2.5 < entropy < 4.8:
+        return "human EEG alike", "green"
+    if entropy > 4.8:
+        return "RANDOM NOISE alike", "red"
+    return "UNKNOWN", "black"
+
+
+class SignalProcessor:
+    def __init__(self, sampling_rate, psd_size):
+        self.sampling_rate = sampling_rate
+        self.psd_size = psd_size
+        self.spectral = SpectralEngine(sampling_rate, psd_size)
+
+    def quality(self, sig):
+        from scipy.stats import kurtosis, skew  # deferred: slow to import
+
+        ptp = np.max(sig) - np.min(sig)
+        rms = np.sqrt(np.mean(sig**2))
+        dc = np.mean(sig)
+        flat = np.mean(np.abs(np.diff(sig)) < 3)
+        return quality_metrics(ptp, rms, dc, flat, kurtosis(sig), skew(sig))
+
+    def spectrum(self, block):
+        # Whole (channels x samples) block at once; returns one metrics dict per row.
+        freqs, psd, _ = self.spectral.compute(block)
+        return self.spectrum_metrics(freqs, psd)
+
+    def spectrum_metrics(self, freqs, psd):
+        m = self.spectral.metrics(psd)
+        per_channel = []
+        for j in range(psd.shape[0]):
+            status, color = classify_spectrum(m['entropy'][j])
+            per_channel.append({'lnr': m['lnr'][j], 'mr': m['mr'][j], 'entropy': m['entropy'][j],
+                                'bands': m['bands'][j].tolist(),
+                                'spectral_status': status, 'spectral_color': color})
+        return freqs, psd, m['bands'].sum(axis=0), per_channel
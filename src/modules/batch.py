@@ -0,0 +1,140 @@
+# batch.py
+"""
+Headless analysis of recorded sessions: streams a BrainFlow CSV through the viewer's pipeline.
+"""
+import csv
+import os
+from collections import defaultdict
+from itertools import islice
+
+import numpy as np
+
+from modules.analysis import SignalProcessor
+from modules.epochs import EpochAccumulator, MarkerEvents, events_from_markers
+from modules.filters import GraphFilters
+from modules.spectral import default_psd_size
+
+BAND_NAMES = ['delta', 'theta', 'alpha', 'beta', 'h_beta', 'gamma', 'h_gamma']
+QUALITY_COLUMNS = ['ptp', 'rms', 'dc', 'flat', 'kurtosis', 'skew', 'status']
+SPECTRAL_COLUMNS = ['lnr', 'mr', 'entropy'] + BAND_NAMES + ['spectral_status']
+
+
+def iter_csv_chunks(path, chunk_size):
+    # BrainFlow CSVs are tab separated with one sample per line; yields (rows x samples) blocks
+    # shaped like get_board_data() so memory stays bounded by chunk_size.
+    with open(path) as f:
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            yield np.loadtxt(lines, delimiter='\t', ndmin=2).T
+
+
+class SessionAnalyzer:
+    """
+    Cuts the stream into fixed-length epochs and records one metrics row per channel and epoch.
+
+    `events` is a list of Events or MarkerEvents; marker onsets are then picked up from each block
+    as it is fed, so they cost no extra pass over the file.
+    """
+
+    def __init__(self, sampling_rate, montage, epoch_seconds=4.0, enabled=None, bp_range=(3.0, 333.0),
+                 events=None):
+        self.sampling_rate = sampling_rate
+        self.montage = montage
+        self.epoch_len = int(round(epoch_seconds * sampling_rate))
+        self.psd_size = default_psd_size(sampling_rate)
+        self.filters = GraphFilters(sampling_rate, montage.names, enabled, bp_range)
+        self.processor = SignalProcessor(sampling_rate, self.psd_size)
+        self.pending = np.empty((len(montage), 0))
+        self.num_epochs = 0
+        self.columns = defaultdict(list)
+        self.events = None
+        self.markers = None
+        if isinstance(events, MarkerEvents):
+            self.markers, events = events, []
+        if events or self.markers is not None:
+            self.events = EpochAccumulator(events, sampling_rate, len(montage), self.psd_size,
+                                           preprocess=self.filters.apply_window_filters)
+
+    def feed(self, data):
+        if self.markers is not None:
+            self.events.add_events(events_from_markers(data[self.markers.row], self.sampling_rate,
+                                                       self.markers.duration, self.events.position))
+        block = self.filters.apply_realtime_filters(self.montage.apply(data))
+        if self.events is not None:
+            self.events.feed(block)
+        self.pending = np.concatenate((self.pending, block), axis=1)
+        while self.pending.shape[1] >= self.epoch_len:
+            self._analyze(self.pending[:, :self.epoch_len])
+            self.pending = self.pending[:, self.epoch_len:]
+
+    def _analyze(self, epoch):
+        traces = self.filters.apply_window_filters(epoch)
+        spectral = [None] * len(traces)
+        if traces.shape[1] > self.psd_size:
+            _, _, _, spectral = self.processor.spectrum(traces)
+
+        start = self.num_epochs * self.epoch_len / self.sampling_rate
+        for i, sig in enumerate(traces):
+            row = self.processor.quality(sig)
+            self.columns['epoch'].append(self.num_epochs)
+            self.columns['start_s'].append(start)
+            self.columns['channel'].append(self.montage.names[i])
+            for key in QUALITY_COLUMNS:
+                self.columns[key].append(row[key])
+            s = spectral[i]
+            for key in ['lnr', 'mr', 'entropy', 'spectral_status']:
+                self.columns[key].append(s[key] if s else np.nan)
+            for name, value in zip(BAND_NAMES, s['bands'] if s else [np.nan] * len(BAND_NAMES)):
+                self.columns[name].append(value)
+        self.num_epochs += 1
+
+    def results(self):
+        return {key: np.asarray(values) for key, values in self.columns.items()}
+
+    def event_results(self):
+        # One row per condition and channel: mean band powers and, for stimulation ON rows,
+        # log10(ON / OFF) band power of the matching setting.
+        columns = defaultdict(list)
+        contrasts = self.events.contrasts()
+        for condition, avg in sorted(self.events.averages().items(), key=lambda kv: str(kv[0])):
+            contrast = contrasts.get(tuple(condition[1:])) if condition[0] == 'ON' else None
+            for i, name in enumerate(self.montage.names):
+                columns['condition'].append(condition[0])
+                columns['setting'].append(' '.join(str(v) for v in condition[1:]))
+                columns['n_epochs'].append(avg['n'])
+                columns['channel'].append(name)
+                bands = avg['bands'][i] if np.ndim(avg['bands']) else [np.nan] * len(BAND_NAMES)
+                ratios = contrast['bands'][i] if contrast else [np.nan] * len(BAND_NAMES)
+                for name, value, ratio in zip(BAND_NAMES, bands, ratios):
+                    columns[name].append(value)
+                    columns[name + '_log_ratio'].append(ratio)
+        return {key: np.asarray(values) for key, values in columns.items()}
+
+
+def write_columns(columns, path):
+    if path.endswith('.csv'):
+        keys = list(columns)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(keys)
+            writer.writerows(zip(*(columns[k].tolist() for k in keys)))
+    else:
+        np.savez_compressed(path, **columns)
+
+
+def analyze_file(path, out_path, sampling_rate, montage, epoch_seconds=4.0, chunk_seconds=60.0, enabled=None,
+                 bp_range=(3.0, 333.0), events=None, events_path=None):
+    analyzer = SessionAnalyzer(sampling_rate, montage, epoch_seconds, enabled, bp_range, events)
+    for data in iter_csv_chunks(path, int(chunk_seconds * sampling_rate)):
+        analyzer.feed(data)
+    write_columns(analyzer.results(), out_path)
+    if events:
+        write_columns(analyzer.event_results(), events_path)
+    return out_path, analyzer.num_epochs
+
+
+def output_path(path, out_dir, fmt, suffix='metrics'):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(out_dir or os.path.dirname(path) or '.', f"{stem}_{suffix}.{fmt}")
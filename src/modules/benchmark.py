@@ -0,0 +1,227 @@
+# benchmark.py
+"""
+Reproducible, headless benchmarks of the signal pipeline on synthetic EEG.
+"""
+import json
+import platform
+import time
+from itertools import product
+
+import numpy as np
+import scipy
+
+from modules.analysis import SignalProcessor
+from modules.filters import DEFAULT_FILTERS, GraphFilters
+from modules.montage import Montage
+from modules.quality import RunningStats
+from modules.spectral import (BANDS, IncrementalWelch, SpectralEngine, default_psd_size, line_noise_ratio,
+                              safe_get_band_power, spectral_entropy)
+
+CHANNELS = [8, 16, 32, 64]
+SAMPLING_RATES = [256, 512, 1024, 2048]
+WINDOWS = [4.0, 30.0]
+TICK_SECONDS = 0.25
+STAGES = ['rt_filter', 'window_filter', 'welch', 'spectral_metrics', 'band_helpers', 'quality_window',
+          'running_stats', 'incremental_psd', 'tick']
+
+
+def synthetic_eeg(num_channels, num_samples, sampling_rate, seed=0):
+    """
+    (channels x samples) test signal: 1/f background, a 10 Hz alpha rhythm, 50 Hz line noise and a
+    per-channel DC offset, all deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    spectrum = rng.standard_normal((num_channels, num_samples // 2 + 1)) \
+        + 1j * rng.standard_normal((num_channels, num_samples // 2 + 1))
+    freqs = np.fft.rfftfreq(num_samples, 1.0 / sampling_rate)
+    spectrum /= np.sqrt(np.maximum(freqs, 1.0))
+    background = np.fft.irfft(spectrum, n=num_samples, axis=1)
+    background *= 20.0 / (background.std(axis=1, keepdims=True) + 1e-12)
+    t = np.arange(num_samples) / sampling_rate
+    phases = rng.uniform(0, 2 * np.pi, (num_channels, 1))
+    alpha = 15.0 * np.sin(2 * np.pi * 10.0 * t + phases)
+    line = 5.0 * np.sin(2 * np.pi * 50.0 * t)
+    offsets = rng.uniform(-2000.0, 2000.0, (num_channels, 1))
+    return background + alpha + line + offsets
+
+
+class SyntheticBoard:
+    """Serves `tick` samples of a precomputed signal on every poll, like a board read once per tick."""
+
+    def __init__(self, signal, tick):
+        self.signal = signal
+        self.tick = tick
+        self.pos = 0
+
+    def get_board_data_count(self):
+        return self.tick
+
+    def get_board_data(self, num_samples):
+        start = self.pos % (self.signal.shape[1] - num_samples)
+        self.pos += num_samples
+        return self.signal[:, start:start + num_samples]
+
+
+def _time(fn, min_time, min_repeats=3):
+    # Per-call durations until both `min_time` seconds and `min_repeats` calls have accumulated,
+    # after one untimed call that warms caches (filter designs, FFT plans, allocator).
+    fn()
+    durations = []
+    start = time.perf_counter()
+    while len(durations) < min_repeats or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - t0)
+    return np.array(durations)
+
+
+def check_running_stats(signal, window, tick, processor, tolerance=1e-6, flat_tolerance=0.01):
+    """
+    Feeds `signal` to RunningStats in `tick`-sized blocks and compares its result with
+    `SignalProcessor.quality` over the last `window` samples, as is and linearly detrended;
+    raises AssertionError on a mismatch. Detrended flatness is approximate (see RunningStats).
+    """
+    from scipy.signal import detrend
+
+    stats = RunningStats(signal.shape[0], window)
+    for start in range(0, signal.shape[1], tick):
+        stats.update(signal[:, start:start + tick])
+    last = signal[:, -window:]
+    for detrended, expected_window in ((False, last), (True, detrend(last, axis=-1))):
+        result = stats.result(detrended=detrended)
+        for i, sig in enumerate(expected_window):
+            expected = processor.quality(sig)
+            for key, value in result.items():
+                limit = flat_tolerance if detrended and key == 'flat' else tolerance * max(1.0, abs(expected[key]))
+                if not abs(value[i] - expected[key]) <= limit:
+                    raise AssertionError(f"RunningStats {key} of channel {i} (detrended={detrended}): "
+                                         f"{value[i]!r} != {expected[key]!r}")
+
+
+def run_case(num_channels, sampling_rate, window_seconds, stages=None, min_time=0.2, seed=0):
+    """
+    Times each stage for one configuration. Returns {stage: {'median_ms', 'p95_ms', 'msamples_per_s'}},
+    where throughput counts channel-samples of input per second of compute.
+    """
+    stages = stages or STAGES
+    num_points = int(window_seconds * sampling_rate)
+    tick = int(TICK_SECONDS * sampling_rate)
+    psd_size = default_psd_size(sampling_rate)
+    signal = synthetic_eeg(num_channels, num_points + 64 * tick, sampling_rate, seed)
+    window = signal[:, :num_points]
+    block = signal[:, num_points:num_points + tick]
+
+    # Every filter kind in the chain enabled, so each stage does its full work.
+    filters = GraphFilters(sampling_rate, list(range(num_channels)),
+                           dict(DEFAULT_FILTERS, bandpass=True, notch50x=True, notchrt50=True))
+    engine = SpectralEngine(sampling_rate, psd_size)
+    processor = SignalProcessor(sampling_rate, psd_size)
+    psd = engine.welch(window)
+
+    def band_helpers():
+        for p in psd:
+            for low, high in BANDS:
+                safe_get_band_power(engine.freqs, p, low, high)
+            spectral_entropy(p)
+            line_noise_ratio(engine.freqs, p)
+
+    if 'running_stats' in stages:
+        check_running_stats(signal, num_points, tick, processor)
+    stats = RunningStats(num_channels, num_points)
+    stats.update(window)
+    incremental = IncrementalWelch(sampling_rate, psd_size, num_channels, num_points)
+    incremental.update(window)
+
+    def running_stats():
+        stats.update(block)
+        stats.result()
+
+    cases = {
+        'rt_filter': (lambda: filters.apply_realtime_filters(block), tick),
+        'window_filter': (lambda: filters.apply_window_filters(window), num_points),
+        'welch': (lambda: engine.welch(window), num_points),
+        'spectral_metrics': (lambda: processor.spectrum_metrics(engine.freqs, psd), num_points),
+        'band_helpers': (band_helpers, num_points),
+        'quality_window': (lambda: [processor.quality(sig) for sig in window], num_points),
+        'running_stats': (running_stats, tick),
+        'incremental_psd': (lambda: incremental.update(block), tick),
+    }
+    if 'tick' in stages:
+        cases['tick'] = (_worker_tick(signal, sampling_rate, num_points, psd_size, tick), tick)
+
+    results = {}
+    for stage in stages:
+        fn, samples = cases[stage]
+        durations = _time(fn, min_time)
+        results[stage] = {
+            'median_ms': float(np.median(durations) * 1000.0),
+            'p95_ms': float(np.percentile(durations, 95) * 1000.0),
+            'msamples_per_s': float(num_channels * samples / np.median(durations) / 1e6),
+        }
+    return results
+
+
+def _worker_tick(signal, sampling_rate, num_points, psd_size, tick):
+    # One complete ProcessingWorker tick (acquire, filters, stats, spectrum) without an event loop.
+    from modules.processing import ProcessingWorker
+
+    num_channels = signal.shape[0]
+    montage = Montage([f"CH{i + 1}" for i in range(num_channels)], list(range(num_channels)), np.eye(num_channels))
+    filters = GraphFilters(sampling_rate, montage.names)
+    worker = ProcessingWorker(SyntheticBoard(signal, tick), filters, montage, sampling_rate, num_points, psd_size)
+    for _ in range(-(-num_points // tick)):
+        worker.process()  # fill the window first
+    return worker.process
+
+
+def run_suite(channels=None, sampling_rates=None, windows=None, stages=None, min_time=0.2, progress=None):
+    results = []
+    for num_channels, sampling_rate, window_seconds in product(channels or CHANNELS, sampling_rates or SAMPLING_RATES,
+                                                               windows or WINDOWS):
+        stage_results = run_case(num_channels, sampling_rate, window_seconds, stages, min_time)
+        results.append({'channels': num_channels, 'sampling_rate': sampling_rate, 'window_s': window_seconds,
+                        'stages': stage_results})
+        if progress is not None:
+            progress(results[-1])
+    return {'environment': environment(), 'tick_s': TICK_SECONDS, 'results': results}
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'system': platform.system()}
+
+
+def _key(result):
+    return result['channels'], result['sampling_rate'], result['window_s']
+
+
+def compare(current, baseline, threshold=0.2, min_delta_ms=0.05):
+    """
+    Median latency ratios current / baseline for every configuration and stage present in both.
+    Returns a list of (config, stage, baseline_ms, current_ms, ratio, regressed); a stage regressed
+    when it is more than `threshold` slower and also at least `min_delta_ms` slower in absolute terms.
+    """
+    base = {_key(r): r['stages'] for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        old = base.get(_key(result))
+        if old is None:
+            continue
+        for stage, now in result['stages'].items():
+            if stage not in old:
+                continue
+            ratio = now['median_ms'] / max(old[stage]['median_ms'], 1e-9)
+            regressed = ratio > 1.0 + threshold and now['median_ms'] - old[stage]['median_ms'] >= min_delta_ms
+            rows.append((_key(result), stage, old[stage]['median_ms'], now['median_ms'], ratio, regressed))
+    return rows
+
+
+def save(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+        f.write('\n')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
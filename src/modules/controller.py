@@ -3,36 +3,49 @@
 Controls real-time EEG signal processing and GUI updates.
 """
 from PyQt5.QtWidgets import QApplication, QWidget
-from modules.ui import GraphUI
+from modules.ui import GraphUI, PlaybackPanel
 from modules.plot_manager import PlotManager
 from modules.filters import GraphFilters
+from modules.montage import Montage
+from modules.profiling import STARTUP
 from brainflow.board_shim import BoardShim
 import sys
 
 
 class GraphController:
-    def __init__(self, board_shim):
+    def __init__(self, board_shim, window_seconds=4, recorder=None, montage_path=None, layout='auto',
+                 profile_panel=False, profile_log=None, scheduler=None, spectrogram=None,
+                 publisher=None):
         self.app = QApplication(sys.argv)
+        STARTUP.mark('qt')
         self.board_shim = board_shim
         self.board_id = board_shim.get_board_id()
-        self.exg_channels = BoardShim.get_exg_channels(self.board_id)[:8]
-        self.virtual_channel_index = len(self.exg_channels)
-        self.exg_channels.append(-1)  # Add virtual channel for C3–C4
-        self.sampling_rate = 512
+        # A MultiBoard lists the EEG rows of all its boards.
+        exg_channels = getattr(board_shim, 'exg_channels', None) or BoardShim.get_exg_channels(self.board_id)
+        self.montage = Montage.load(montage_path, exg_channels) if montage_path else Montage.default(exg_channels)
+        # Seekable playback knows the recorded rate; otherwise use the board's nominal rate.
+        self.sampling_rate = getattr(board_shim, 'sampling_rate', None) or BoardShim.get_sampling_rate(self.board_id)
 
-        self.filters = GraphFilters(self.sampling_rate, self.exg_channels)
+        self.filters = GraphFilters(self.sampling_rate, self.montage.names)
         self.ui = GraphUI(self.filters)
         self.main_widget = QWidget()
 
-        self.virtual_index = 9
-
         self.plot_manager = PlotManager(
-            self.ui, self.board_shim, self.filters,
-            self.exg_channels, self.virtual_channel_index,
-            self.sampling_rate, self.main_widget
+            self.ui, self.board_shim, self.filters, self.montage,
+            self.sampling_rate, self.main_widget, window_seconds, recorder, layout,
+            profile_panel, profile_log, scheduler, spectrogram, publisher
         )
+        STARTUP.mark('gui')
+
+        self.playback_panel = None
+        if hasattr(board_shim, 'seek'):
+            from modules.playback import OverviewTiles
+            tiles = OverviewTiles(board_shim.reader, self.montage.rows[0])
+            self.playback_panel = PlaybackPanel(board_shim, tiles)
+            self.plot_manager.add_panel(self.playback_panel.widget)
 
         self.main_widget.show()
+        STARTUP.mark('show')
 
     def run(self):
         self.app.exec_()
@@ -0,0 +1,156 @@
+# epochs.py
+"""
+Stimulation events, epoch cutting and incremental per-condition averages.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from modules.spectral import SpectralEngine, default_psd_size
+
+# `condition` is ('ON' | 'OFF', stim_channel, volume, frequency) for metadata schedules and
+# ('MARK', value) for marker-channel events.
+Event = namedtuple('Event', ['onset', 'duration', 'condition'])
+# Events to be found in the stream itself: every non-zero sample of board row `row` starts one.
+MarkerEvents = namedtuple('MarkerEvents', ['row', 'duration'])
+
+
+def _sweep(section):
+    # Start/End/Steps with Steps as the increment, e.g. Volume 50..100 step 25 -> 50, 75, 100.
+    start, end, step = section['Start'], section['End'], section.get('Steps') or 0
+    if step <= 0 or end == start:
+        return [start]
+    return [start + i * step for i in range(int((end - start) // step) + 1)]
+
+
+def schedule_from_metadata(metadata):
+    """
+    ON/OFF events (seconds from recording start) implied by the measure configuration of a sidecar.
+
+    After `Pre-start_EEG_measurement`, every channel x volume x frequency combination (in that nesting
+    order) is measured `Number` times as `Duration_on` of stimulation followed by `Duration_off` of rest.
+    """
+    measurements = metadata['Measurements']
+    on, off = measurements['Duration_on'], measurements['Duration_off']
+    t = float(measurements.get('Pre-start_EEG_measurement') or 0)
+    events = []
+    for channel in _sweep(metadata['Channel']):
+        for volume in _sweep(metadata['Volume']):
+            for frequency in _sweep(metadata['Frequency']):
+                for _ in range(int(measurements['Number'])):
+                    events.append(Event(t, on, ('ON', channel, volume, frequency)))
+                    events.append(Event(t + on, off, ('OFF', channel, volume, frequency)))
+                    t += on + off
+    return events
+
+
+def events_from_markers(marker_row, sampling_rate, duration, first_sample=0):
+    """
+    One event per non-zero sample of a BrainFlow marker row, labelled by the marker value;
+    `first_sample` is the stream index of the row's first sample when it is one chunk of a session.
+    """
+    idx = np.flatnonzero(marker_row)
+    return [Event((first_sample + i) / sampling_rate, duration, ('MARK', float(marker_row[i]))) for i in idx]
+
+
+class EpochAccumulator:
+    """
+    Cuts epochs out of a continuous (channels x samples) stream as soon as they are complete and keeps
+    running per-condition sums of the waveform, PSD and band powers.
+
+    All epochs completed by one `feed` call are stacked and analysed together (one Welch call over
+    epochs x channels). Only the samples still needed by pending events are buffered.
+    """
+
+    def __init__(self, events, sampling_rate, num_channels, psd_size=None, preprocess=None):
+        self.sampling_rate = sampling_rate
+        self.num_channels = num_channels
+        self.preprocess = preprocess
+        self.spectral = SpectralEngine(sampling_rate, psd_size or default_psd_size(sampling_rate))
+        self.events = []
+        self._spans = []
+        self._next = 0
+        self.position = 0
+        self.buffer_start = 0
+        self.buffer = np.empty((num_channels, 0))
+        self.sums = {}
+        self.add_events(events)
+
+    def add_events(self, events):
+        """
+        Appends events, e.g. markers found in the block about to be fed. They may not start before
+        the samples already fed or before an event added earlier.
+        """
+        for e in sorted(events, key=lambda e: e.onset):
+            start = int(round(e.onset * self.sampling_rate))
+            if start < self.position or (self._spans and start < self._spans[-1][0]):
+                raise ValueError(f"event at {e.onset:.3f} s is out of order")
+            self.events.append(e)
+            self._spans.append((start, start + int(round(e.duration * self.sampling_rate))))
+
+    def feed(self, block):
+        self.buffer = np.concatenate((self.buffer, block), axis=1)
+        self.position += block.shape[1]
+
+        ready = []
+        while self._next < len(self.events) and self._spans[self._next][1] <= self.position:
+            start, stop = self._spans[self._next]
+            if start >= self.buffer_start:
+                ready.append(self._next)
+            self._next += 1
+        by_length = {}
+        for k in ready:
+            start, stop = self._spans[k]
+            by_length.setdefault(stop - start, []).append(k)
+        for length, indices in by_length.items():
+            self._accumulate(indices, length)
+
+        keep_from = self._spans[self._next][0] if self._next < len(self.events) else self.position
+        keep_from = min(max(keep_from, self.buffer_start), self.position)
+        self.buffer = self.buffer[:, keep_from - self.buffer_start:]
+        self.buffer_start = keep_from
+
+    def _accumulate(self, indices, length):
+        offsets = [self._spans[k][0] - self.buffer_start for k in indices]
+        epochs = np.stack([self.buffer[:, o:o + length] for o in offsets])  # epochs x channels x samples
+        if self.preprocess is not None:
+            epochs = self.preprocess(epochs)
+        psd = self.spectral.welch(epochs) if length >= self.spectral.psd_size else None
+        bands = psd @ self.spectral.band_weights if psd is not None else None
+
+        conditions = [self.events[k].condition for k in indices]
+        for condition in set(conditions):
+            mask = np.array([c == condition for c in conditions])
+            entry = self.sums.get(condition)
+            if entry is None:
+                entry = self.sums[condition] = {'n': 0, 'waveform': 0.0, 'psd': 0.0, 'bands': 0.0}
+            entry['n'] += int(mask.sum())
+            entry['waveform'] = entry['waveform'] + epochs[mask].sum(axis=0)
+            if psd is not None:
+                entry['psd'] = entry['psd'] + psd[mask].sum(axis=0)
+                entry['bands'] = entry['bands'] + bands[mask].sum(axis=0)
+
+    def averages(self):
+        """condition -> {'n', 'waveform' (ch x samples), 'psd' (ch x freqs), 'bands' (ch x bands)}"""
+        return {c: {'n': e['n'], 'waveform': e['waveform'] / e['n'], 'psd': e['psd'] / e['n'],
+                    'bands': e['bands'] / e['n']} for c, e in self.sums.items() if e['n']}
+
+    def contrasts(self):
+        """('ON' vs 'OFF') log10 power ratios per stimulation setting: key -> {'bands', 'psd'}."""
+        averages = self.averages()
+        result = {}
+        for condition, on in averages.items():
+            if condition[0] != 'ON':
+                continue
+            off = averages.get(('OFF',) + tuple(condition[1:]))
+            if off is None or np.ndim(on['psd']) == 0 or np.ndim(off['psd']) == 0:
+                continue
+            result[tuple(condition[1:])] = {
+                'bands': np.log10((on['bands'] + 1e-20) / (off['bands'] + 1e-20)),
+                'psd': np.log10((on['psd'] + 1e-20) / (off['psd'] + 1e-20)),
+            }
+        return result
+
+    @property
+    def freqs(self):
+        return self.spectral.freqs
@@ -2,66 +2,161 @@
 """
 Filter classes and logic for EEG signal processing.
 """
+import time
+from functools import lru_cache
+
 import numpy as np
-from PyQt5.QtWidgets import QCheckBox, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit
-from brainflow.data_filter import DataFilter, FilterTypes, DetrendOperations
-from scipy.signal import butter, lfilter, lfilter_zi, iirnotch, filtfilt
 
 
-class RealtimeNotchFilter:
-    def __init__(self, f0=50.0, Q=100.0, fs=512.0):
-        self.b, self.a = iirnotch(f0, Q, fs)
-        self.zi = lfilter_zi(self.b, self.a) * 0
+@lru_cache(maxsize=64)
+def design_filter(kind, cutoffs, order, fs):
+    """Return SOS coefficients; cached on (kind, cutoffs, order, fs) so redesigns only happen on change."""
+    from scipy.signal import butter, iirnotch, tf2sos  # deferred: slow to import
 
-    def filter_sample(self, sample):
-        filtered, self.zi = lfilter(self.b, self.a, [sample], zi=self.zi)
-        return filtered[0]
+    if kind == 'notch':
+        f0, Q = cutoffs
+        return tf2sos(*iirnotch(f0, Q, fs))
+    btype = {'bandpass': 'bandpass', 'bandstop': 'bandstop', 'highpass': 'high', 'lowpass': 'low'}[kind]
+    return butter(order, cutoffs, btype=btype, fs=fs, output='sos')
 
-    def filter(self, chunk):
-        filtered, self.zi = lfilter(self.b, self.a, chunk, zi=self.zi)
-        return filtered
 
+@lru_cache(maxsize=16)
+def design_harmonic_notch(f0, half_width, order, fs):
+    """Bandstops at f0 and its harmonics below Nyquist, collapsed into one SOS cascade."""
+    harmonics = np.arange(f0, fs / 2.0 - half_width, f0)
+    return np.vstack([design_filter('bandstop', (f - half_width, f + half_width), order, fs) for f in harmonics])
+
+
+class RealtimeFilterBank:
+    """Stateful IIR filter applied to a (channels x samples) block in one lfilter call."""
+
+    def __init__(self, b, a, num_channels):
+        self.b, self.a = b, a
+        self.zi = np.zeros((num_channels, max(len(a), len(b)) - 1))
+
+    @classmethod
+    def highpass(cls, cutoff, fs, num_channels, order=4):
+        from scipy.signal import butter
 
-class RealtimeHighPass:
-    def __init__(self, cutoff, fs, order=4):
-        nyq = 0.5 * fs
-        self.b, self.a = butter(order, cutoff / nyq, btype='high')
-        self.zi = lfilter_zi(self.b, self.a) * 0
+        b, a = butter(order, cutoff / (0.5 * fs), btype='high')
+        return cls(b, a, num_channels)
 
-    def filter(self, sample):
-        filtered, self.zi = lfilter(self.b, self.a, [sample], zi=self.zi)
-        return filtered[0]
+    @classmethod
+    def notch(cls, f0, Q, fs, num_channels):
+        from scipy.signal import iirnotch
 
-    def filter_chunk(self, samples):
-        filtered, self.zi = lfilter(self.b, self.a, samples, zi=self.zi)
+        b, a = iirnotch(f0, Q, fs)
+        return cls(b, a, num_channels)
+
+    def reset(self):
+        self.zi[:] = 0
+
+    def filter(self, block):
+        from scipy.signal import lfilter
+
+        filtered, self.zi = lfilter(self.b, self.a, block, axis=-1, zi=self.zi)
         return filtered
 
 
+FILTER_LABELS = {
+    'bandpass': "Bandpass (3–333 Hz)",
+    'notch50x': "Notch 50+H Hz",
+    'notchff50': "Notch ff 50 Hz",
+    'detrend': "Detrend",
+    'rthp': "RTHP1Hz",
+    'notchrt50': "Notch rt 50 Hz",
+}
+
+DEFAULT_FILTERS = {'bandpass': False, 'notch50x': False, 'notchff50': False,
+                   'detrend': True, 'rthp': True, 'notchrt50': False}
+
+
 class GraphFilters:
-    def __init__(self, sampling_rate, exg_channels):
+    def __init__(self, sampling_rate, exg_channels, enabled=None, bp_range=(3.0, 333.0)):
         self.sampling_rate = sampling_rate
         self.exg_channels = exg_channels
 
-        self.filter_enable = {
-            'bandpass': QCheckBox("Bandpass (3–333 Hz)"),
-            'notch50x': QCheckBox("Notch 50+H Hz"),
-            'notchff50': QCheckBox("Notch ff 50 Hz"),
-            'detrend': QCheckBox("Detrend"),
-            'rthp': QCheckBox("RTHP1Hz"),
-            'notchrt50': QCheckBox("Notch rt 50 Hz")
-        }
+        # Plain-Python filter state; the Qt widgets built by get_filter_layout() only mirror into it,
+        # so the same object also drives headless processing.
+        self.enabled = dict(DEFAULT_FILTERS, **(enabled or {}))
+        self.bp_range = bp_range
+        self._window_key = None
+        self._window_sos = None
+
+        # Real-time filter banks are designed on first use (see the properties below).
+        self._rthp_bank = None
+        self._rtnotch_bank = None
+
+    @property
+    def rthp_bank(self):
+        if self._rthp_bank is None:
+            self._rthp_bank = RealtimeFilterBank.highpass(1.0, self.sampling_rate, len(self.exg_channels))
+        return self._rthp_bank
+
+    @property
+    def rtnotch_bank(self):
+        if self._rtnotch_bank is None:
+            self._rtnotch_bank = RealtimeFilterBank.notch(50.0, 30.0, self.sampling_rate, len(self.exg_channels))
+        return self._rtnotch_bank
+
+    def reset_realtime(self):
+        for bank in (self._rthp_bank, self._rtnotch_bank):
+            if bank is not None:
+                bank.reset()
+
+    def _set_enabled(self, key, checked):
+        self.enabled[key] = checked
+
+    def _read_bandpass_inputs(self):
+        try:
+            self.bp_range = (float(self.bp_low_input.text()), float(self.bp_high_input.text()))
+        except ValueError:
+            print("Invalid bandpass cutoff values.")
+            self.bp_range = None
+
+    def _bandpass_sos(self):
+        low, high = self.bp_range
+        nyq = 0.5 * self.sampling_rate
+        if high >= nyq:
+            # Upper edge beyond Nyquist: only the high-pass half of the band is realisable.
+            return design_filter('highpass', low, 2, self.sampling_rate)
+        return design_filter('bandpass', (low, high), 2, self.sampling_rate)
+
+    def window_sos(self):
+        """Cascade of every enabled zero-phase filter, rebuilt only after a settings change."""
+        # Keyed on the settings themselves so a change from the GUI thread is never lost
+        # to a rebuild racing on the processing thread.
+        key = (self.enabled['bandpass'], self.enabled['notch50x'], self.enabled['notchff50'], self.bp_range)
+        if key != self._window_key:
+            sections = []
+            if self.enabled['bandpass'] and self.bp_range is not None:
+                try:
+                    sections.append(self._bandpass_sos())
+                except ValueError:
+                    print("Invalid bandpass cutoff values.")
+            if self.enabled['notch50x']:
+                sections.append(design_harmonic_notch(50.0, 2.0, 2, self.sampling_rate))
+            if self.enabled['notchff50']:
+                sections.append(design_filter('notch', (50.0, 50.0), 2, self.sampling_rate))
+            self._window_sos = np.vstack(sections) if sections else np.empty((0, 6))
+            self._window_key = key
+        return self._window_sos
 
-        self.filter_enable['bandpass'].setChecked(False)
-        self.filter_enable['detrend'].setChecked(True)
-        self.filter_enable['rthp'].setChecked(True)
+    def get_filter_layout(self):
+        # Qt is only needed when the filters get a GUI; headless analysis never calls this.
+        from PyQt5.QtWidgets import QCheckBox, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit
 
-        self.bp_low_input = QLineEdit("3.0")
-        self.bp_high_input = QLineEdit("333.0")
+        self.filter_enable = {key: QCheckBox(label) for key, label in FILTER_LABELS.items()}
+        for key, cb in self.filter_enable.items():
+            cb.setChecked(self.enabled[key])
+            cb.toggled.connect(lambda checked, key=key: self._set_enabled(key, checked))
 
-        self.rthp_filters = [RealtimeHighPass(1.0, sampling_rate) for _ in exg_channels]
-        self.rtnotch_filters = [RealtimeNotchFilter(50.0, 30.0, sampling_rate) for _ in exg_channels]
+        low, high = self.bp_range if self.bp_range is not None else (3.0, 333.0)
+        self.bp_low_input = QLineEdit(str(low))
+        self.bp_high_input = QLineEdit(str(high))
+        self.bp_low_input.editingFinished.connect(self._read_bandpass_inputs)
+        self.bp_high_input.editingFinished.connect(self._read_bandpass_inputs)
 
-    def get_filter_layout(self):
         vlayout = QVBoxLayout()
         h1 = QHBoxLayout()
         h1.addWidget(QLabel("Bandpass:"))
@@ -82,39 +177,42 @@ class GraphFilters:
         vlayout.addLayout(h2)
         return vlayout
 
-    def apply_filters(self, sig, count):
-        filtered_sig = sig.copy()
-
-        if self.filter_enable['detrend'].isChecked():
-            DataFilter.detrend(filtered_sig, DetrendOperations.LINEAR.value)
-
-        if self.filter_enable['bandpass'].isChecked():
-            try:
-                low = float(self.bp_low_input.text())
-                high = float(self.bp_high_input.text())
-                DataFilter.perform_bandpass(
-                    filtered_sig, self.sampling_rate, low, high,
-                    2, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0
-                )
-            except ValueError:
-                print("Invalid bandpass cutoff values.")
-
-        if self.filter_enable['notch50x'].isChecked():
-            for freq in [50, 100, 150, 200, 250]:
-                DataFilter.perform_bandstop(
-                    filtered_sig, self.sampling_rate,
-                    freq - 2.0, freq + 2.0,
-                    2, FilterTypes.BUTTERWORTH_ZERO_PHASE, 0
-                )
-
-        if self.filter_enable['notchff50'].isChecked():
-            b, a = iirnotch(50.0, 50.0, self.sampling_rate)
-            filtered_sig = filtfilt(b, a, filtered_sig)
-
-        if self.filter_enable['rthp'].isChecked():
-            filtered_sig[:] = [self.rthp_filters[count].filter(s) for s in filtered_sig]
-
-        if self.filter_enable['notchrt50'].isChecked():
-            filtered_sig[:] = [self.rtnotch_filters[count].filter_sample(s) for s in filtered_sig]
+    def apply_window_filters(self, sig, timings=None):
+        # Works on a single channel or a (channels x samples) block.
+        # `timings`, if given, receives the duration of each step under 'filter.<step>'.
+        from scipy.signal import detrend, sosfiltfilt
+
+        t0 = time.perf_counter()
+        filtered_sig = np.array(sig, dtype=np.float64)
+
+        if self.enabled['detrend']:
+            filtered_sig = detrend(filtered_sig, axis=-1, type='linear')
+        t1 = time.perf_counter()
+
+        sos = self.window_sos()
+        if len(sos) and filtered_sig.shape[-1] > 1:
+            padlen = min(3 * (2 * len(sos) + 1), filtered_sig.shape[-1] - 1)
+            filtered_sig = sosfiltfilt(sos, filtered_sig, axis=-1, padlen=padlen)
 
+        if timings is not None:
+            timings['filter.detrend'] = t1 - t0
+            timings['filter.sosfiltfilt'] = time.perf_counter() - t1
         return filtered_sig
+
+    def apply_realtime_filters(self, block, timings=None):
+        # Stateful filters: each sample must be passed through exactly once.
+        # `block` is (channels x samples), one row per EXG channel.
+        t0 = time.perf_counter()
+        filtered = np.asarray(block, dtype=np.float64)
+
+        if self.enabled['rthp']:
+            filtered = self.rthp_bank.filter(filtered)
+        t1 = time.perf_counter()
+
+        if self.enabled['notchrt50']:
+            filtered = self.rtnotch_bank.filter(filtered)
+
+        if timings is not None:
+            timings['rt_filter.rthp'] = t1 - t0
+            timings['rt_filter.notch'] = time.perf_counter() - t1
+        return filtered
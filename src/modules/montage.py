@@ -0,0 +1,100 @@
+# montage.py
+"""
+Display/analysis montage: which board inputs are shown, under which names, and which derived
+(bipolar, re-referenced, common-average) channels are computed from them.
+"""
+import json
+
+import numpy as np
+
+from modules.analysis import CHANNEL_MAPPING
+
+
+class Montage:
+    """
+    Maps board data to display channels with one matrix multiply.
+
+    `rows` are the board rows read (the board's EXG rows of every input); `matrix` has one row per
+    display channel and one column per entry of `rows`, so plain channels, references and derived
+    channels are all `matrix @ data[rows]`.
+    """
+
+    def __init__(self, names, rows, matrix, derived=None):
+        self.names = list(names)
+        self.rows = list(rows)
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.derived = list(derived) if derived is not None else [False] * len(self.names)
+        if self.matrix.shape != (len(self.names), len(self.rows)):
+            raise ValueError(f"montage matrix has shape {self.matrix.shape}, expected "
+                             f"({len(self.names)}, {len(self.rows)})")
+
+    def __len__(self):
+        return len(self.names)
+
+    def apply(self, data):
+        """(board rows x samples) -> (display channels x samples)"""
+        return self.matrix @ data[self.rows]
+
+    @classmethod
+    def from_config(cls, config, exg_channels):
+        """
+        Builds a montage from a parsed config; see `montages/*.json`.
+
+        `inputs` lists `{"name", "input"}` with 1-based EXG input numbers (or "all" for every input,
+        named from CHANNEL_MAPPING). `reference` ("average" or an input name) re-references the plain
+        channels; an input used as reference is not shown itself. Each `derived` entry is a weighted
+        sum of input names, where "average" stands for the mean of all inputs, e.g.
+        {"name": "C3–C4", "weights": {"C3": 1, "C4": -1}}.
+        """
+        inputs = config.get('inputs', 'all')
+        if inputs == 'all':
+            inputs = [{'name': CHANNEL_MAPPING.get(i, f"CH{i}"), 'input': i} for i in range(1, len(exg_channels) + 1)]
+        columns = {}
+        rows = []
+        for entry in inputs:
+            number = int(entry['input'])
+            if not 1 <= number <= len(exg_channels):
+                raise ValueError(f"input {number} outside 1..{len(exg_channels)}")
+            columns[entry['name']] = len(rows)
+            rows.append(exg_channels[number - 1])
+
+        def weights_vector(weights):
+            vector = np.zeros(len(rows))
+            for name, weight in weights.items():
+                if name == 'average':
+                    vector += weight / len(rows)
+                elif name in columns:
+                    vector[columns[name]] += weight
+                else:
+                    raise ValueError(f"unknown montage channel {name!r}")
+            return vector
+
+        reference = config.get('reference')
+        names, matrix, derived = [], [], []
+        for name in columns:
+            if name == reference:
+                continue  # a channel referenced to itself is identically zero
+            weights = {name: 1.0}
+            if reference is not None:
+                weights[reference] = -1.0
+            names.append(name)
+            matrix.append(weights_vector(weights))
+            derived.append(False)
+        for entry in config.get('derived', []):
+            names.append(entry['name'])
+            matrix.append(weights_vector(entry['weights']))
+            derived.append(True)
+        return cls(names, rows, np.array(matrix).reshape(len(names), len(rows)), derived)
+
+    @classmethod
+    def load(cls, path, exg_channels):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_config(json.load(f), exg_channels)
+
+    @classmethod
+    def default(cls, exg_channels):
+        # The original viewer layout: first eight inputs plus the virtual C3–C4.
+        inputs = [{'name': CHANNEL_MAPPING.get(i, f"CH{i}"), 'input': i}
+                  for i in range(1, min(8, len(exg_channels)) + 1)]
+        derived = [{'name': "C3–C4", 'weights': {"C3": 1, "C4": -1}}] if len(inputs) >= 4 else []
+        return cls.from_config({'inputs': inputs, 'derived': derived}, exg_channels)
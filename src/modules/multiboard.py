@@ -0,0 +1,251 @@
+# multiboard.py
+"""
+Concurrent acquisition from several boards, merged onto the first board's sample clock.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from brainflow.board_shim import BoardShim
+
+EXG_KEYS = ('eeg_channels', 'emg_channels', 'ecg_channels', 'eog_channels')
+
+
+def describe(board):
+    """(sampling_rate, num_rows, board_descr) of a BoardShim or a PlaybackBoard."""
+    reader = getattr(board, 'reader', None)
+    if reader is not None:
+        return reader.sampling_rate, reader.num_rows, dict(reader.board_descr)
+    board_id = board.get_board_id()
+    return BoardShim.get_sampling_rate(board_id), BoardShim.get_num_rows(board_id), BoardShim.get_board_descr(board_id)
+
+
+class SourceClock:
+    """
+    Host time of every sample of one source, from a sample counter and the board's timestamps.
+
+    BrainFlow stamps samples when their packet is received, so a stamp is the sample time plus a
+    packet and transport delay that is never negative. The clock places sample `k` at
+    `anchor + k / rate` and follows the lower envelope of `stamp - k / rate`: a block that arrived
+    earlier than predicted moves the anchor at once, a later one only by `gain` of the difference
+    (enough to follow drift between the boards' oscillators). A block more than `resync_seconds`
+    late (lost samples, reconnect) re-anchors at once.
+    """
+
+    def __init__(self, sampling_rate, gain=0.01, resync_seconds=0.5):
+        self.rate = float(sampling_rate)
+        self.gain = gain
+        self.resync = resync_seconds
+        self.anchor = None
+        self.count = 0
+
+    def update(self, timestamps):
+        k = self.count + np.arange(len(timestamps))
+        offset = float(np.min(timestamps - k / self.rate))
+        if self.anchor is None or offset < self.anchor or offset - self.anchor > self.resync:
+            self.anchor = offset
+        else:
+            self.anchor += self.gain * (offset - self.anchor)
+        self.count += len(timestamps)
+        return self.anchor + k / self.rate
+
+
+class AcquisitionSource:
+    """
+    One board drained by its own thread into a time-stamped buffer of up to `capacity_seconds`.
+
+    `clock` selects the timestamps fed to the SourceClock: 'board' uses the board's timestamp
+    channel, 'arrival' the host time at which each block was read (for playback boards, whose
+    timestamps are those of the original session); 'auto' picks 'board' unless the first
+    timestamps are more than 5 s away from the host clock. `latency_seconds` is a known fixed delay
+    between acquisition and receipt (e.g. a wireless link) subtracted from every time.
+    """
+
+    def __init__(self, board, name=None, clock='auto', poll_seconds=0.01, capacity_seconds=60.0,
+                 latency_seconds=0.0):
+        self.board = board
+        self.name = name or str(board.get_board_id())
+        self.sampling_rate, self.num_rows, self.descr = describe(board)
+        self.timestamp_row = self.descr.get('timestamp_channel')
+        if self.timestamp_row is None:
+            clock = 'arrival'
+        self.clock_mode = clock
+        self.clock = SourceClock(self.sampling_rate)
+        self.latency = latency_seconds
+        self.poll_seconds = poll_seconds
+        self.capacity = int(capacity_seconds * self.sampling_rate)
+        self.dropped = 0
+        self.times = np.empty(0)
+        self.data = np.empty((self.num_rows, 0))
+        self.samples = 0  # received in total
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'Acquisition-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data = self.board.get_board_data()
+            except Exception:
+                logging.exception("Reading from board %s failed", self.name)
+                data = None
+            if data is not None and data.shape[1]:
+                self._append(data, time.time())
+            self._stop.wait(self.poll_seconds)
+
+    def _append(self, data, now):
+        n = data.shape[1]
+        arrival = now - np.arange(n - 1, -1, -1) / self.sampling_rate
+        if self.clock_mode == 'auto':
+            self.clock_mode = 'board' if abs(data[self.timestamp_row, -1] - now) < 5.0 else 'arrival'
+            logging.info("Board %s: using %s timestamps", self.name, self.clock_mode)
+        times = self.clock.update(data[self.timestamp_row] if self.clock_mode == 'board' else arrival) - self.latency
+        with self._lock:
+            self.times = np.concatenate((self.times, times))
+            self.data = np.concatenate((self.data, data), axis=1)
+            self.samples += n
+            excess = len(self.times) - self.capacity
+            if excess > 0:  # nobody is consuming; keep the newest `capacity_seconds`
+                self.times, self.data = self.times[excess:], self.data[:, excess:]
+                self.dropped += excess
+
+    def last_time(self):
+        with self._lock:
+            return self.times[-1] if len(self.times) else None
+
+    def take(self, n):
+        # Removes and returns the first `n` samples (primary source).
+        with self._lock:
+            times, data = self.times[:n], self.data[:, :n]
+            self.times, self.data = self.times[n:], self.data[:, n:]
+        return times, data
+
+    def resample(self, grid):
+        """
+        Rows linearly interpolated at the times in `grid` (held at the ends), then drops every sample
+        before the one preceding grid[-1]. One vectorised gather for all rows, no per-sample loop.
+        """
+        with self._lock:
+            times, data = self.times, self.data
+            if len(times) == 0:
+                return np.zeros((self.num_rows, len(grid)))
+            if len(times) == 1:
+                return np.repeat(data, len(grid), axis=1)
+            right = np.clip(np.searchsorted(times, grid, side='right'), 1, len(times) - 1)
+            t0, t1 = times[right - 1], times[right]
+            w = np.clip((grid - t0) / np.maximum(t1 - t0, 1e-12), 0.0, 1.0)
+            out = data[:, right - 1] * (1.0 - w) + data[:, right] * w
+            keep = max(0, int(np.searchsorted(times, grid[-1], side='right')) - 1)
+            self.times, self.data = times[keep:], data[:, keep:]
+        return out
+
+
+class MultiBoard:
+    """
+    Stands in for a BoardShim and serves the rows of several boards as one board.
+
+    The first source is the timeline: its samples pass through unchanged, and every other source is
+    interpolated at the host times of those samples and appended as extra rows (after the first
+    board's rows, in source order). Samples are released once every live source has data up to
+    their time, so the merged stream lags by about one packet of the slowest board. A source that
+    falls more than `max_lag_seconds` behind is treated as stalled: its rows hold their last value
+    and the others keep flowing.
+    """
+
+    def __init__(self, sources, max_lag_seconds=1.0):
+        self.sources = list(sources)
+        self.primary = self.sources[0]
+        self.sampling_rate = self.primary.sampling_rate
+        self.max_lag = max_lag_seconds
+        self.stalled = set()
+        self.row_offsets = list(np.cumsum([0] + [s.num_rows for s in self.sources[:-1]]))
+        self.num_rows = sum(s.num_rows for s in self.sources)
+        self.board_descr = dict(self.primary.descr, num_rows=self.num_rows, sources=[
+            {'name': s.name, 'row_offset': int(offset), 'sampling_rate': s.sampling_rate, 'board_descr': s.descr}
+            for s, offset in zip(self.sources, self.row_offsets)])
+        # EEG-type rows of every board, first board first; montages address them as inputs 1..N.
+        self.exg_channels = [int(offset) + row for s, offset in zip(self.sources, self.row_offsets)
+                             for row in sorted({r for key in EXG_KEYS for r in s.descr.get(key, [])})]
+        self._prepared = False
+        self._started = time.time()
+
+    # BoardShim-compatible surface used by the viewer
+    def get_board_id(self):
+        return self.primary.board.get_board_id()
+
+    def prepare_session(self):
+        for s in self.sources:
+            if not s.board.is_prepared():
+                s.board.prepare_session()
+        self._prepared = True
+
+    def is_prepared(self):
+        return self._prepared
+
+    def start_stream(self, *args):
+        # Streamer parameters only apply to the first board.
+        self._started = time.time()
+        for i, s in enumerate(self.sources):
+            s.board.start_stream(*(args if i == 0 else args[:1]))
+            s.start()
+
+    def stop_stream(self):
+        for s in self.sources:
+            s.stop()
+            s.board.stop_stream()
+
+    def release_session(self):
+        for s in self.sources:
+            s.stop()
+            if s.board.is_prepared():
+                s.board.release_session()
+        self._prepared = False
+
+    def _horizon(self):
+        # Latest host time up to which every live secondary source has delivered; None before any data.
+        primary_last = self.primary.last_time()
+        if primary_last is None:
+            return None
+        horizon = primary_last
+        for s in self.sources[1:]:
+            last = s.last_time()
+            if primary_last - (self._started if last is None else last) > self.max_lag:
+                if s.name not in self.stalled:
+                    logging.warning("Board %s stalled; holding its last values", s.name)
+                    self.stalled.add(s.name)
+                continue
+            if last is None:
+                return None  # still starting up
+            if s.name in self.stalled:
+                logging.info("Board %s resumed", s.name)
+                self.stalled.discard(s.name)
+            horizon = min(horizon, last)
+        return horizon
+
+    def get_board_data_count(self):
+        horizon = self._horizon()
+        if horizon is None:
+            return 0
+        with self.primary._lock:
+            return int(np.searchsorted(self.primary.times, horizon, side='right'))
+
+    def get_board_data(self, num_samples=None):
+        count = self.get_board_data_count()
+        if num_samples is not None:
+            count = min(count, num_samples)
+        times, data = self.primary.take(count)
+        if count == 0:
+            return np.empty((self.num_rows, 0))
+        return np.concatenate([data] + [s.resample(times) for s in self.sources[1:]], axis=0)
@@ -0,0 +1,175 @@
+# playback.py
+"""
+Playback of .eegbin recordings at adjustable speed with instant seeking, independent of BrainFlow's board.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class PlaybackBoard:
+    """
+    Stands in for a streaming BoardShim, serving samples from a RecordingReader.
+
+    The read cursor follows wall-clock time scaled by `speed`. After a seek the next read also returns
+    `preroll_seconds` of data before the target, so the window and the real-time filters are warm
+    immediately instead of replaying from the start. Each seek bumps `generation` so consumers know
+    the stream is discontinuous.
+    """
+
+    def __init__(self, reader, speed=1.0, preroll_seconds=6.0):
+        self.reader = reader
+        self.sampling_rate = reader.sampling_rate
+        self.preroll = int(preroll_seconds * reader.sampling_rate)
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._speed = speed
+        self._paused = False
+        self._prepared = False
+        self._streaming = False
+        self._read_pos = 0
+        self._anchor_pos = 0.0
+        self._anchor_time = time.monotonic()
+
+    # BoardShim-compatible surface used by the viewer
+    def get_board_id(self):
+        return self.reader.board_id
+
+    def prepare_session(self):
+        self._prepared = True
+
+    def is_prepared(self):
+        return self._prepared
+
+    def start_stream(self, *args):
+        with self._lock:
+            self._streaming = True
+            self._anchor_time = time.monotonic()
+
+    def stop_stream(self):
+        with self._lock:
+            self._anchor_pos = self._cursor()
+            self._streaming = False
+
+    def release_session(self):
+        self._prepared = False
+
+    def get_board_data_count(self):
+        with self._lock:
+            return int(self._cursor()) - self._read_pos
+
+    def get_board_data(self, num_samples=None):
+        return self.read_block(num_samples)[1]
+
+    def read_block(self, num_samples=None):
+        # (generation, data) taken under one lock, so a concurrent seek cannot pair post-seek
+        # samples with the generation before it.
+        with self._lock:
+            stop = int(self._cursor())
+            if num_samples is not None:
+                stop = min(stop, self._read_pos + num_samples)
+            data = self.reader.board_data(self._read_pos, stop)
+            self._read_pos = stop
+            return self.generation, data
+
+    def get_current_board_data(self, num_samples):
+        with self._lock:
+            stop = int(self._cursor())
+        return self.reader.board_data(max(0, stop - num_samples), stop)
+
+    # Playback controls
+    def _cursor(self):
+        if not self._streaming or self._paused:
+            return self._anchor_pos
+        advanced = (time.monotonic() - self._anchor_time) * self.sampling_rate * self._speed
+        return min(self._anchor_pos + advanced, self.reader.num_samples)
+
+    def _reanchor(self, pos):
+        self._anchor_pos = float(pos)
+        self._anchor_time = time.monotonic()
+
+    @property
+    def speed(self):
+        return self._speed
+
+    def set_speed(self, speed):
+        with self._lock:
+            self._reanchor(self._cursor())
+            self._speed = speed
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def set_paused(self, paused):
+        with self._lock:
+            self._reanchor(self._cursor())
+            self._paused = paused
+
+    def position(self):
+        with self._lock:
+            return self._cursor() / self.sampling_rate
+
+    @property
+    def duration(self):
+        return self.reader.duration
+
+    def seek(self, seconds):
+        target = self.reader.index_at(seconds)
+        with self._lock:
+            self._reanchor(target)
+            self._read_pos = max(0, target - self.preroll)
+            self.generation += 1
+
+
+class OverviewTiles:
+    """
+    Min/max pyramid of one recording row, built once from the memory map.
+
+    Level 0 summarises `base` samples per tile and every further level halves the tile count, so any
+    span of the recording can be drawn at screen resolution without touching the samples again.
+    """
+
+    def __init__(self, reader, row, base=256, chunk_samples=1 << 20):
+        self.sampling_rate = reader.sampling_rate
+        self.num_samples = reader.num_samples
+        self.base = base
+        n_tiles = -(-self.num_samples // base)
+        mins = np.empty(n_tiles, dtype=np.float32)
+        maxs = np.empty(n_tiles, dtype=np.float32)
+        chunk_samples -= chunk_samples % base
+        for start in range(0, self.num_samples, chunk_samples):
+            seg = np.asarray(reader.samples(start, start + chunk_samples, row), dtype=np.float32)
+            pad = -len(seg) % base
+            if pad:
+                seg = np.pad(seg, (0, pad), mode='edge')
+            tiles = seg.reshape(-1, base)
+            first = start // base
+            mins[first:first + len(tiles)] = tiles.min(axis=1)
+            maxs[first:first + len(tiles)] = tiles.max(axis=1)
+
+        self.levels = [(mins, maxs)]
+        while len(mins) > 1:
+            if len(mins) % 2:
+                mins, maxs = np.append(mins, mins[-1]), np.append(maxs, maxs[-1])
+            mins = np.minimum(mins[0::2], mins[1::2])
+            maxs = np.maximum(maxs[0::2], maxs[1::2])
+            self.levels.append((mins, maxs))
+
+    def envelope(self, width_px, start_s=0.0, stop_s=None):
+        """Returns (seconds, values) with two points per tile at the coarsest level that still fills `width_px`."""
+        stop_s = self.num_samples / self.sampling_rate if stop_s is None else stop_s
+        span = max(1, int((stop_s - start_s) * self.sampling_rate))
+        level = 0
+        while level + 1 < len(self.levels) and span / (self.base << (level + 1)) >= width_px:
+            level += 1
+        tile = self.base << level
+        mins, maxs = self.levels[level]
+        first = int(start_s * self.sampling_rate) // tile
+        last = min(len(mins), -(-int(stop_s * self.sampling_rate) // tile))
+        x = np.repeat((np.arange(first, last) * tile + tile / 2) / self.sampling_rate, 2)
+        y = np.empty(2 * (last - first), dtype=np.float32)
+        y[0::2] = mins[first:last]
+        y[1::2] = maxs[first:last]
+        return x, y
@@ -2,118 +2,108 @@
 """
 Handles EEG data plotting, PSD calculation, and real-time updates.
 """
-import numpy as np
-from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QScrollArea, QCheckBox
-import pyqtgraph as pg
-from pyqtgraph import ViewBox
-
-from scipy.signal import welch
-from scipy.stats import kurtosis, skew
-
+import time
 
+from PyQt5.QtCore import QEvent, QObject, QThread, QTimer, Qt, QMetaObject
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QLabel, QHBoxLayout, QGridLayout, QCheckBox
+import pyqtgraph as pg
 
+from modules.analysis import CHANNEL_MAPPING  # noqa: F401  (re-exported)
+from modules.processing import ProcessingWorker
+from modules.profiling import STARTUP, Profiler, format_summary
+from modules.scheduler import AdaptiveScheduler
+from modules.rendering import TraceDecimator
+from modules.spectrogram import SpectrogramPanel, resolve_channels
+from modules.traces import ChannelPlots, StackedTraces, channel_pens
+from modules.spectral import (RollingSTFT, default_psd_size, safe_get_band_power, spectral_entropy,  # noqa: F401
+                              line_noise_ratio)
 
 
 pg.setConfigOption('background', 'w')
 pg.setConfigOption('foreground', 'k')
 
-CHANNEL_MAPPING = {1: "T7", 2: "T8", 3: "C3", 4: "C4", 5: "FC3", 6: "FC4", 7: "CP3", 8: "CP4"}
+# Montages with more channels than this are drawn on a single stacked canvas by default.
+STACKED_THRESHOLD = 12
+PROFILE_LOG_INTERVAL_MS = 10000
 
 
-def safe_get_band_power(freqs, psd, freq_start, freq_end):
-    mask = (freqs >= freq_start) & (freqs <= freq_end)
-    if not np.any(mask):
-        return 0.0
-    return np.trapezoid(psd[mask], freqs[mask])
+class PaintTimer(QObject):
+    """
+    Times how long the window takes to repaint (pyqtgraph scene painting included).
 
+    Installed on the top-level widget, it handles the UpdateRequest that flushes pending paints
+    itself, between two clock reads, instead of letting it pass through.
+    """
 
-def spectral_entropy(psd_values):
-    psd_values = np.array(psd_values, dtype=np.float64)
-    psd_norm = psd_values / (np.sum(psd_values) + 1e-10)
-    return -np.sum(psd_norm * np.log2(psd_norm + 1e-10))
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+        self._inside = False
 
+    def eventFilter(self, obj, event):
+        if event.type() != QEvent.UpdateRequest or self._inside:
+            return False
+        self._inside = True
+        t0 = time.perf_counter()
+        try:
+            obj.event(event)
+        finally:
+            self._inside = False
+        self.profiler.record({'paint': time.perf_counter() - t0})
+        return True
 
-def line_noise_ratio(freqs, psd, target_freq=50.0, tol=1.0):
-    band = (freqs > target_freq - tol) & (freqs < target_freq + tol)
-    total_power = np.sum(psd[(freqs > 1) & (freqs < 45)]) + 1e-10
-    line_power = np.sum(psd[band])
-    return line_power / total_power
 
 class PlotManager:
-    def __init__(self, ui, board_shim, filters, exg_channels, virtual_index, sampling_rate, main_widget):
+    def __init__(self, ui, board_shim, filters, montage, sampling_rate, main_widget, window_seconds=4,
+                 recorder=None, layout='auto', profile_panel=False, profile_log=None, scheduler=None,
+                 spectrogram=None, publisher=None):
         self.ui = ui
         self.board_shim = board_shim
         self.filters = filters
-        self.exg_channels = exg_channels
-        self.virtual_index = virtual_index
+        self.montage = montage
+        if layout == 'auto':
+            layout = 'stacked' if len(montage) > STACKED_THRESHOLD else 'separate'
+        self.layout = layout
         self.sampling_rate = sampling_rate
         self.main_widget = main_widget
-        self.psd_size = max(64, min(1024, 2 ** int(np.log2(sampling_rate))))
-        self.num_points = sampling_rate * 4
-        self.pens_used = []  
+        self.recorder = recorder
+        self.publisher = publisher
+        self.psd_size = default_psd_size(sampling_rate)
+        self.num_points = int(sampling_rate * window_seconds)
+        self.decimator = TraceDecimator()
+        self.last_seq = 0
+        self.scheduler = scheduler or AdaptiveScheduler()
+        self.profiler = Profiler(self.scheduler.trace_interval_ms)
+        self.profile_log = profile_log
         self._init_plot()  # <- this builds the GUI on the provided main_widget
+        self._init_spectrogram(spectrogram)
+        self._init_profiling(profile_panel)
+        self._init_worker()
 
     def _init_plot(self):
         #self.main_widget = self.ui.control_container.parent()
 
         # Time plots
-        self.scroll = QScrollArea()
-        self.scroll.setWidgetResizable(True)
-        self.time_plot_container = QWidget()
-        self.time_plot_layout = QVBoxLayout()
-        self.time_plot_container.setLayout(self.time_plot_layout)
-        self.scroll.setWidget(self.time_plot_container)
-
-        # Create plots and labels
-        self.curves, self.labels, self.psd_curves, self.channel_checkboxes = [], [], [], []
-        self.channel_widgets = []
-
-        self.pens = [pg.mkPen(c, width=2) for c in ['#A54E4E', '#A473B6', '#5B45A4', '#2079D2', '#32B798', '#2FA537', '#9DA52F', '#A57E2F']]
-
-        for i in range(len(self.exg_channels)):
-            ch_name = "C3–C4" if i == self.virtual_index else CHANNEL_MAPPING.get(i + 1, f"CH{i + 1}")
-            channel_widget = QWidget()
-            layout = QVBoxLayout()
-
-            plot = pg.PlotWidget()
-            plot.setXRange(0, self.num_points)
-            plot.enableAutoRange(axis='x', enable=False)
-            plot.setMaximumHeight(100)
-            plot.setLabel('left', f"{ch_name} (\u00B5V)")
-            plot.showGrid(y=True)
-            pen = pg.mkPen('blue', width=2, style=Qt.DashLine) if i == self.virtual_index else self.pens[i % len(self.pens)]
-            curve = plot.plot(pen=pen)
-
-            label1 = QLabel()
-            label2 = QLabel()
-            for lbl in [label1, label2]:
-                lbl.setAlignment(Qt.AlignRight)
-                lbl.setStyleSheet("font-size: 9pt")
-
-            layout.addWidget(plot)
-            layout.addWidget(label1)
-            layout.addWidget(label2)
-            channel_widget.setLayout(layout)
-
-            self.time_plot_layout.addWidget(channel_widget)
-            self.curves.append(curve)
-            self.labels.append((label1, label2))
-            self.channel_widgets.append(channel_widget)
-            self.pens_used.append(pen)  # Store actual pen used
-
-
+        if self.layout == 'stacked':
+            self.pens_used = channel_pens(self.montage, width=1)
+            self.traces = StackedTraces(self.montage, self.num_points, self.pens_used)
+        else:
+            self.pens_used = channel_pens(self.montage)
+            self.traces = ChannelPlots(self.montage, self.num_points, self.pens_used)
+        self.curves = self.traces.curves
+        self.traces.connect_view_changed(self._update_in_view)
+
+        self.channel_checkboxes = []
+        cb_group = QWidget()
+        cb_layout = QGridLayout()
+        for i, ch_name in enumerate(self.montage.names):
             cb = QCheckBox(ch_name)
             cb.setChecked(True)
             cb.stateChanged.connect(self._update_channel_visibility)
             self.channel_checkboxes.append(cb)
-
-        self.ui.control_vbox.addWidget(QLabel("Channels ON/OFF"))
-        cb_group = QWidget()
-        cb_layout = QHBoxLayout()
-        for cb in self.channel_checkboxes:
-            cb_layout.addWidget(cb)
+            cb_layout.addWidget(cb, i // 9, i % 9)
         cb_group.setLayout(cb_layout)
+        self.ui.control_vbox.addWidget(QLabel("Channels ON/OFF"))
         self.ui.control_vbox.addWidget(cb_group)
 
         # PSD plot
@@ -123,8 +113,8 @@ class PlotManager:
         self.psd_plot.setLabel('left', 'Power (\u00B5V²/Hz)')
         self.psd_plot.setLabel('bottom', 'Frequency (Hz)')
         self.psd_plot.showGrid(x=True, y=True)
-#        self.psd_curves = [self.psd_plot.plot(pen=self.pens[i % len(self.pens)]) for i in range(len(self.exg_channels))]
-        self.psd_curves = [self.psd_plot.plot(pen=pen) for pen in self.pens_used]
+        self.psd_curves = [None] * len(self.montage)  # added when a channel's first PSD arrives
+        self._shown_psds = [None] * len(self.psd_curves)
 
 
         # Band power bar chart
@@ -139,7 +129,7 @@ class PlotManager:
 
         # Layout all widgets
         layout = QHBoxLayout()
-        layout.addWidget(self.scroll, stretch=3)
+        layout.addWidget(self.traces.widget, stretch=3)
 
         right_panel = QVBoxLayout()
         right_panel.addWidget(self.ui.control_container)
@@ -149,7 +139,9 @@ class PlotManager:
         container.setLayout(right_panel)
 
         layout.addWidget(container, stretch=2)
-        self.main_widget.setLayout(layout)
+        self.outer_layout = QVBoxLayout()
+        self.outer_layout.addLayout(layout, stretch=1)
+        self.main_widget.setLayout(self.outer_layout)
 
         # Y-axis sync
         self.ui.y_apply_btn.clicked.connect(self._apply_y_range)
@@ -157,23 +149,75 @@ class PlotManager:
         self.ui.psd_y_apply_btn.clicked.connect(self._apply_psd_y_range)
         self.ui.psd_y_auto_checkbox.stateChanged.connect(self._apply_psd_y_range)
 
-        # Timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update)
-        self.timer.start(250)
+        self.latency_label = QLabel()
+        self.latency_label.setStyleSheet("font-size: 8pt")
+        self.ui.control_vbox.addWidget(self.latency_label)
+
+    def _init_worker(self):
+        # Acquisition and all number crunching run in a QThread; the GUI only renders snapshots.
+        self.worker = ProcessingWorker(
+            self.board_shim, self.filters, self.montage, self.sampling_rate, self.num_points, self.psd_size,
+            recorder=self.recorder, profiler=self.profiler, scheduler=self.scheduler, spectrogram=self.stft,
+            publisher=self.publisher
+        )
+        self.worker_thread = QThread()
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.start)
+        self.worker.snapshot_ready.connect(self.update)
+        self.ui.psd_mode_combo.currentIndexChanged.connect(self._apply_psd_mode)
+        QApplication.instance().aboutToQuit.connect(self.stop)
+        self.worker_thread.start()
+
+    def _init_spectrogram(self, settings):
+        # The STFT runs in the worker on the real-time filtered stream; the panel only draws new columns.
+        self.stft = self.spectrogram_panel = None
+        self._spectrogram_generation = 0
+        if settings is None or not settings.channels:
+            return
+        channels = resolve_channels(self.montage, settings.channels)
+        hop = max(1, int(round(settings.hop_seconds * self.sampling_rate)))
+        self.stft = RollingSTFT(self.sampling_rate, self.psd_size, hop, channels, settings.freq_range)
+        history = max(2, int(round(settings.history_seconds * self.sampling_rate / hop)))
+        self.spectrogram_panel = SpectrogramPanel([self.montage.names[i] for i in channels], self.stft.freqs,
+                                                  hop / self.sampling_rate, history)
+        self.add_panel(self.spectrogram_panel.widget)
+
+    def _init_profiling(self, panel):
+        self.paint_timer = PaintTimer(self.profiler)
+        self.main_widget.installEventFilter(self.paint_timer)
+        self.profile_label = None
+        if panel:
+            self.profile_label = QLabel()
+            self.profile_label.setStyleSheet("font-size: 8pt")
+            self.ui.control_vbox.addWidget(self.profile_label)
+            self.profile_timer = QTimer()
+            self.profile_timer.timeout.connect(self._show_profile)
+            self.profile_timer.start(1000)
+        if self.profile_log:
+            self.profile_log_timer = QTimer()
+            self.profile_log_timer.timeout.connect(lambda: self.profiler.dump(self.profile_log))
+            self.profile_log_timer.start(PROFILE_LOG_INTERVAL_MS)
+
+    def _show_profile(self):
+        self.profile_label.setText(format_summary(self.profiler.summary()))
+
+    def stop(self):
+        QMetaObject.invokeMethod(self.worker, "stop", Qt.BlockingQueuedConnection)
+        self.worker_thread.quit()
+        self.worker_thread.wait()
+        if self.profile_log:
+            self.profiler.dump(self.profile_log)
+
+    def add_panel(self, widget):
+        # Full-width panels below the plots, e.g. playback controls.
+        self.outer_layout.addWidget(widget)
 
     def _apply_y_range(self):
-        auto = self.ui.y_auto_checkbox.isChecked()
-        for curve in self.curves:
-            vb = curve.getViewBox()
-            vb.enableAutoRange(ViewBox.YAxis, enable=auto)
-            if not auto:
-                try:
-                    ymin = float(self.ui.y_min_input.text())
-                    ymax = float(self.ui.y_max_input.text())
-                    vb.setYRange(ymin, ymax)
-                except ValueError:
-                    pass
+        try:
+            y_range = float(self.ui.y_min_input.text()), float(self.ui.y_max_input.text())
+        except ValueError:
+            y_range = None
+        self.traces.apply_y_range(self.ui.y_auto_checkbox.isChecked(), y_range)
 
     def _apply_psd_y_range(self):
         auto = self.ui.psd_y_auto_checkbox.isChecked()
@@ -186,73 +230,63 @@ class PlotManager:
             except ValueError:
                 pass
 
+    def _apply_psd_mode(self):
+        self.worker.psd_mode = self.ui.psd_mode_combo.currentData()
+
     def _update_channel_visibility(self):
-        for i, (cb, widget) in enumerate(zip(self.channel_checkboxes, self.channel_widgets)):
-            widget.setVisible(cb.isChecked())
-            self.curves[i].setVisible(cb.isChecked())
-            self.psd_curves[i].setVisible(cb.isChecked())
+        visible = [cb.isChecked() for cb in self.channel_checkboxes]
+        self.traces.set_visible(visible)
+        for curve, shown in zip(self.psd_curves, visible):
+            if curve is not None:
+                curve.setVisible(shown)
+        self.worker.visible = visible
+        self._update_in_view()
+
+    def _update_in_view(self, *_):
+        if hasattr(self, 'worker'):
+            self.worker.in_view = self.traces.in_view()
 
     def update(self):
-        data = self.board_shim.get_current_board_data(self.num_points)
-        avg_bands = [0] * 7
-
-        for i in range(len(self.exg_channels)):
-            if not self.channel_checkboxes[i].isChecked():
-                self.curves[i].setData([])
+        snapshot = self.worker.take_latest()
+        if snapshot is None or snapshot.seq <= self.last_seq:
+            return  # a newer snapshot was already drawn; stale ones are dropped
+        if snapshot.seq > self.last_seq + 1:
+            self.profiler.count('dropped_snapshots', snapshot.seq - self.last_seq - 1)
+        self.last_seq = snapshot.seq
+        t0 = time.perf_counter()
+
+        self.traces.render(snapshot, self.decimator)
+        t1 = time.perf_counter()
+        for i, psd in enumerate(snapshot.psds):
+            if psd is self._shown_psds[i]:
+                continue  # unchanged (staggered or out of view)
+            self._shown_psds[i] = psd
+            if psd is None:
                 self.psd_curves[i].setData([], [])
-                continue
-
-            sig = data[self.exg_channels[i]] if i != self.virtual_index else data[self.exg_channels[2]] - data[self.exg_channels[3]]
-            sig = self.filters.apply_filters(sig, i)
-            self.curves[i].setData(sig.tolist())
-
-            ptp = max(sig) - min(sig)
-            rms = np.sqrt(np.mean(sig**2))
-            dc = np.mean(sig)
-            flat = np.mean(np.abs(np.diff(sig)) < 3)
-            k = kurtosis(sig)
-            s = skew(sig)
-
-            color = "green"
-            status = "OK"
-            if ptp < 10 or flat > 0.95:
-                status, color = "FLAT", "gray"
-            elif ptp > 1000:
-                status, color = "NOISY", "red"
-            elif rms > 100:
-                status, color = "HIGH RMS", "darkgreen"
-            elif k > 10:
-                status, color = "SPIKY", "orange"
-
-            label1, label2 = self.labels[i]
-            label1.setText(f"<span style='color:{color}'>PTP: {ptp:.1f} | RMS: {rms:.1f} | DC: {dc:.1f} | Flat: {flat:.2f} | Kurtosis: {k:.2f} | Skew: {s:.2f} | {status}</span>")
-
-            if sig.shape[0] > self.psd_size:
-                freqs, psd = welch(sig, fs=self.sampling_rate, nperseg=self.psd_size, window='blackmanharris')
-                self.psd_curves[i].setData(freqs[:300], psd[:300])
-
-                delta = safe_get_band_power(freqs, psd, 1.0, 4.0)
-                theta = safe_get_band_power(freqs, psd, 4.0, 8.0)
-                alpha = safe_get_band_power(freqs, psd, 8.0, 13.0)
-                beta = safe_get_band_power(freqs, psd, 13.0, 20.0)
-                h_beta = safe_get_band_power(freqs, psd, 20.0, 30.0)
-                gamma = safe_get_band_power(freqs, psd, 30.0, 60.0)
-                h_gamma = safe_get_band_power(freqs, psd, 60.0, 100.0)
-
-                avg_bands = [sum(x) for x in zip(avg_bands, [delta, theta, alpha, beta, h_beta, gamma, h_gamma])]
-
-                ln_ratio = line_noise_ratio(freqs, psd)
-                muscle_ratio = (gamma + h_gamma) / (alpha + beta + 1e-10)
-                entropy = spectral_entropy(psd)
-
-                status2, color2 = "UNKNOWN", "black"
-                if 2.5 < entropy < 4.8:
-                    status2, color2 = "human EEG alike", "green"
-                elif entropy > 4.8:
-                    status2, color2 = "RANDOM NOISE alike", "red"
-
-                label2.setText(f"<span style='color:{color2}'>LNR: {ln_ratio:.2f} | MR: {muscle_ratio:.2f} | Ent: {entropy:.2f} | δ: {delta:.1f} | θ: {theta:.1f} | α: {alpha:.1f} | β: {beta:.1f} | h-β: {h_beta:.1f} | γ: {gamma:.1f} | h-γ: {h_gamma:.1f} | {status2}</span>")
-
-        total_power = sum(avg_bands) + 1e-10
-        norm_bands = [x / total_power * 100 for x in avg_bands]
-        self.bar.setOpts(height=norm_bands)
+            else:
+                if self.psd_curves[i] is None:
+                    self.psd_curves[i] = self.psd_plot.plot(pen=self.pens_used[i])
+                self.psd_curves[i].setData(snapshot.freqs[:300], psd[:300])
+
+        t2 = time.perf_counter()
+        self.bar.setOpts(height=list(snapshot.band_percent))
+
+        t3 = time.perf_counter()
+        if self.spectrogram_panel is not None:
+            generation, columns = self.worker.take_spectrogram()
+            if generation != self._spectrogram_generation:
+                self._spectrogram_generation = generation
+                self.spectrogram_panel.clear()
+            if columns is not None:
+                self.spectrogram_panel.push(columns)
+        t4 = time.perf_counter()
+        self.profiler.record({'render': t4 - t0, 'render.traces': t1 - t0, 'render.psd': t2 - t1,
+                              'render.bars': t3 - t2, 'render.spectrogram': t4 - t3})
+        if not STARTUP.reported:
+            STARTUP.mark('first frame')
+            self.profiler.startup = STARTUP.report()
+        timings = dict(snapshot.timings, render=t4 - t0)
+        self.latency_label.setText("Latency (ms): " + " | ".join(
+            f"{k} {v * 1000:.1f}" for k, v in timings.items() if '.' not in k)
+            + f"<br>Traces every {self.scheduler.trace_interval_ms} ms, metrics every "
+              f"{self.scheduler.metrics_interval_ms:.0f} ms")
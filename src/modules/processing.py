@@ -0,0 +1,244 @@
+# processing.py
+"""
+Signal processing engine that runs off the Qt GUI thread and publishes per-tick snapshots.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal, pyqtSlot
+
+from modules.analysis import SignalProcessor, quality_metrics
+from modules.profiling import Profiler
+from modules.quality import RunningStats
+from modules.scheduler import AdaptiveScheduler
+from modules.spectral import BANDS, IncrementalWelch
+from modules.stream import StreamBuffer
+
+# Immutable result of one processing tick. `metrics[i]` is None for hidden channels; metrics and PSDs
+# are the most recent ones computed, which with staggering may be from an earlier tick. `traces[i]` is
+# only filled where `in_view[i]` is set.
+Snapshot = namedtuple('Snapshot', ['seq', 'traces', 'freqs', 'psds', 'metrics', 'band_percent', 'timings',
+                                   'in_view'])
+
+
+class ProcessingWorker(QObject):
+    """Lives in its own QThread; acquisition, filtering and metrics never touch the GUI thread."""
+
+    snapshot_ready = pyqtSignal()
+
+    def __init__(self, board_shim, filters, montage, sampling_rate, num_points, psd_size,
+                 interval_ms=250, recorder=None, profiler=None, scheduler=None, spectrogram=None, publisher=None):
+        super().__init__()
+        self.filters = filters
+        self.sampling_rate = sampling_rate
+        self.num_channels = len(montage)
+        self.stream = StreamBuffer(board_shim, filters, montage, num_points, recorder)
+        self.processor = SignalProcessor(sampling_rate, psd_size)
+        self.psd_size = psd_size
+        # Without a scheduler every channel is fully processed on each `interval_ms` tick.
+        self.scheduler = scheduler or AdaptiveScheduler(interval_ms, interval_ms, adaptive=False)
+        self.profiler = profiler if profiler is not None else Profiler(self.scheduler.trace_interval_ms)
+        # Both replaced wholesale from the GUI thread; out-of-view channels are not processed.
+        self.visible = [True] * self.num_channels
+        self.in_view = [True] * self.num_channels
+        self.psd_mode = 'window'  # 'window' (full Welch each tick), 'sliding' or 'ema'
+        self.num_points = num_points
+        self.incremental = None  # IncrementalWelch, built when an incremental PSD mode is first selected
+        self._psd_mode = None  # mode of the previous tick; the estimator is not fed in 'window' mode
+        self.running_stats = RunningStats(self.num_channels, num_points)
+        self._stats_live = False  # running_stats holds the current window
+        # Optional RollingSTFT; its columns queue up until the GUI takes them, so none are lost
+        # when snapshots are coalesced.
+        self.spectrogram = spectrogram
+        self._spectrogram_columns = deque(maxlen=256)
+        self._spectrogram_generation = self.stream.generation
+        # Optional StreamPublisher: new blocks, PSDs and metrics go out as they are computed.
+        self.publisher = publisher
+        if publisher is not None:
+            publisher.set_stream_info(montage.names, sampling_rate, np.fft.rfftfreq(psd_size, 1.0 / sampling_rate))
+            if publisher.profiler is None:
+                publisher.profiler = self.profiler
+        self.timer = None
+        self._reset_cache()
+        self._seq = 0
+        self._latest = None
+        self._lock = threading.Lock()
+
+    @pyqtSlot()
+    def start(self):
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.process)
+        self.timer.start(self.scheduler.trace_interval_ms)
+
+    @pyqtSlot()
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+
+    def take_latest(self):
+        # Anything older than the most recent snapshot has already been discarded.
+        with self._lock:
+            snapshot, self._latest = self._latest, None
+        return snapshot
+
+    def take_spectrogram(self):
+        # (generation, all STFT columns computed since the last call as (channels, n, bins), or None).
+        # Columns queued before a seek are discarded, so every column returned belongs to `generation`.
+        with self._lock:
+            columns = list(self._spectrogram_columns)
+            self._spectrogram_columns.clear()
+            generation = self._spectrogram_generation
+        return generation, np.concatenate(columns, axis=1) if columns else None
+
+    def _update_spectrogram(self, new_block, timings):
+        t0 = time.perf_counter()
+        columns = self.spectrogram.update(new_block)
+        if columns is not None:
+            with self._lock:
+                self._spectrogram_columns.append(columns)
+        timings['spectrogram'] = time.perf_counter() - t0
+
+    def _reset_cache(self):
+        self._freqs = None
+        self._metrics = [None] * self.num_channels
+        self._psds = [None] * self.num_channels
+
+    def _update_incremental_psd(self, new_block):
+        # Cached segment periodograms of the real-time filtered stream; window filters are not applied.
+        psd_mode, previous = self.psd_mode, self._psd_mode
+        self._psd_mode = psd_mode
+        if psd_mode == 'window':
+            return None
+        if self.incremental is None:
+            self.incremental = IncrementalWelch(self.sampling_rate, self.psd_size, self.num_channels,
+                                                self.num_points, mode=psd_mode)
+        elif psd_mode != previous:  # other mode, or stale segments from before a 'window' period
+            self.incremental.mode = psd_mode
+            self.incremental.reset()
+        return self.incremental.update(new_block)
+
+    def _spectrum(self, stream_psd, data, traces, channels):
+        if not channels:
+            return None
+        if stream_psd is not None:
+            return self.processor.spectrum_metrics(self.incremental.freqs, stream_psd[channels])
+        if self.psd_mode == 'window' and data.shape[1] > self.psd_size:
+            return self.processor.spectrum(traces[channels])
+        return None
+
+    def _quality(self, traces, channels):
+        # Fresh metrics dicts for `channels`; published dicts are never modified afterwards.
+        if self._stats_live:
+            # Only causal filters plus optional detrend in play: the streaming statistics describe
+            # the displayed window, so no per-window pass is needed.
+            stats = self.running_stats.result(detrended=self.filters.enabled['detrend'])
+            if stats is not None:
+                for i in channels:
+                    self._metrics[i] = quality_metrics(*(stats[k][i] for k in
+                                                         ('ptp', 'rms', 'dc', 'flat', 'kurtosis', 'skew')))
+                return
+        for i in channels:
+            self._metrics[i] = self.processor.quality(traces[i])
+
+    def _update_running_stats(self, new_block):
+        # Kept up to date only while _quality uses it; re-seeded from the stream window when it is
+        # needed again (the ring holds exactly the real-time filtered samples it consumes).
+        if len(self.filters.window_sos()):
+            self._stats_live = False
+        elif self._stats_live:
+            self.running_stats.update(new_block)
+        else:
+            self.running_stats.reset()
+            self.running_stats.update(self.stream.window())
+            self._stats_live = True
+
+    def _adapt(self):
+        # Cost of a tick: the worker's own time or the GUI's render + repaint, whichever is larger.
+        worker = self.profiler.percentile('total')
+        render, paint = self.profiler.percentile('render'), self.profiler.percentile('paint')
+        gui = (render or 0.0) + (paint or 0.0) if render is not None or paint is not None else None
+        costs = [c for c in (worker, gui) if c is not None]
+        if self.scheduler.adapt(max(costs) if costs else None) and self.timer is not None:
+            self.timer.setInterval(self.scheduler.trace_interval_ms)
+            self.profiler.reset_interval(self.scheduler.trace_interval_ms)
+
+    @pyqtSlot()
+    def process(self):
+        timings = {'acquire': 0.0, 'rt_filter': 0.0}
+        t0 = time.perf_counter()
+        self.profiler.tick(t0)
+        generation = self.stream.generation
+        new_block = self.stream.poll(timings)
+        self.profiler.observe('backlog_ms', self.stream.backlog * 1000.0 / self.sampling_rate)
+        if hasattr(self.stream.recorder, 'backlog'):
+            self.profiler.observe('recorder_queue', self.stream.recorder.backlog)
+        if self.stream.generation != generation:
+            self._stats_live = False
+            if self.incremental is not None:
+                self.incremental.reset()
+            self._reset_cache()
+            if self.spectrogram is not None:
+                self.spectrogram.reset()
+                with self._lock:
+                    self._spectrogram_columns.clear()
+                    self._spectrogram_generation = self.stream.generation
+        if self.spectrogram is not None:
+            self._update_spectrogram(new_block, timings)
+        if self.publisher is not None:
+            self.publisher.publish_samples(self.stream.buffer.total - new_block.shape[1], new_block,
+                                           self.stream.generation)
+        data = self.stream.window()
+        t1 = time.perf_counter()
+        if data.shape[1] < 2:
+            self._update_running_stats(new_block)
+            self._update_incremental_psd(new_block)
+            return
+
+        self.scheduler.advance()
+        visible = self.visible
+        shown = [i for i, v in enumerate(visible) if v and self.in_view[i]]
+        traces = np.zeros_like(data)
+        if shown:
+            traces[shown] = self.filters.apply_window_filters(data[shown], timings)
+        t2 = time.perf_counter()
+        timings['filter'] = t2 - t1
+
+        # Metrics are staggered: each tick handles the in-view channels whose turn it is.
+        due = self.scheduler.metric_channels(shown)
+        self._update_running_stats(new_block)
+        self._quality(traces, due)
+        t3 = time.perf_counter()
+        timings['stats'] = t3 - t2
+
+        stream_psd = self._update_incremental_psd(new_block)
+        spectrum = self._spectrum(stream_psd, data, traces, due)
+        if spectrum is not None:
+            self._freqs, psd, _, spectral = spectrum
+            psd.flags.writeable = False
+            for j, i in enumerate(due):
+                self._psds[i] = psd[j]
+                self._metrics[i].update(spectral[j])
+            if self.publisher is not None:
+                self.publisher.publish_psd(due, psd, self.stream.generation)
+        timings['spectral'] = time.perf_counter() - t3
+        timings['total'] = time.perf_counter() - t0
+        self.profiler.record(timings)
+        if self.scheduler.due_for_evaluation():
+            self._adapt()
+
+        metrics = tuple(m if v else None for m, v in zip(self._metrics, visible))
+        if self.publisher is not None and due:
+            self.publisher.publish_metrics(metrics, self.stream.generation)
+        psds = tuple(p if v else None for p, v in zip(self._psds, visible))
+        bands = [m['bands'] for m in metrics if m is not None and 'bands' in m]
+        avg_bands = np.sum(bands, axis=0) if bands else np.zeros(len(BANDS))
+        band_percent = tuple(avg_bands / (avg_bands.sum() + 1e-10) * 100)
+        traces.flags.writeable = False
+        self._seq += 1
+        in_view = tuple(v and w for v, w in zip(visible, self.in_view))
+        snapshot = Snapshot(self._seq, traces, self._freqs, psds, metrics, band_percent, timings, in_view)
+        with self._lock:
+            self._latest = snapshot
+        self.snapshot_ready.emit()
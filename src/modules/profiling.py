@@ -0,0 +1,153 @@
+# profiling.py
+"""
+Rolling per-stage timings, tick health counters and board backlog for the update loop, plus
+startup milestones.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class Profiler:
+    """
+    Collects stage durations (seconds) and gauges from the worker and GUI threads.
+
+    Every stage keeps its last `history` samples, so `summary()` reports rolling p50/p95/max.
+    `tick()` is called at the start of each timer tick: a gap of more than 1.5 intervals since
+    the previous tick counts as late, and every whole interval beyond the first as a missed tick.
+    """
+
+    def __init__(self, interval_ms, history=240):
+        self.interval = interval_ms / 1000.0
+        self.history = history
+        self.started = time.time()
+        self._stages = {}
+        self._gauges = {}
+        self.counters = {'ticks': 0, 'late_ticks': 0, 'missed_ticks': 0, 'over_budget': 0, 'dropped_snapshots': 0}
+        self.startup = None  # StartupTimer.report() once the first frame is drawn
+        self._last_tick = None
+        self._lock = threading.Lock()
+
+    def _series(self, table, name):
+        series = table.get(name)
+        if series is None:
+            series = table[name] = deque(maxlen=self.history)
+        return series
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self.counters['ticks'] += 1
+            if self._last_tick is not None:
+                gap = now - self._last_tick
+                if gap > 1.5 * self.interval:
+                    self.counters['late_ticks'] += 1
+                    self.counters['missed_ticks'] += int(gap / self.interval) - 1
+            self._last_tick = now
+
+    def record(self, timings):
+        with self._lock:
+            for name, seconds in timings.items():
+                self._series(self._stages, name).append(seconds)
+            if timings.get('total', 0.0) > self.interval:
+                self.counters['over_budget'] += 1
+
+    def observe(self, name, value):
+        with self._lock:
+            self._series(self._gauges, name).append(value)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset_interval(self, interval_ms):
+        # The tick interval changed (e.g. adaptive scheduling); restart gap measurement.
+        with self._lock:
+            self.interval = interval_ms / 1000.0
+            self._last_tick = None
+
+    def percentile(self, name, q=95):
+        # Seconds; None until the stage has been recorded.
+        with self._lock:
+            series = self._stages.get(name)
+            if not series:
+                return None
+            return float(np.percentile(np.fromiter(series, dtype=np.float64, count=len(series)), q))
+
+    @staticmethod
+    def _percentiles(series, scale=1.0):
+        values = np.fromiter(series, dtype=np.float64, count=len(series)) * scale
+        p50, p95 = np.percentile(values, [50, 95])
+        return {'p50': float(p50), 'p95': float(p95), 'max': float(values.max()), 'n': len(values)}
+
+    def summary(self):
+        """Stage times in ms and gauges as p50/p95/max over the rolling history, plus counters."""
+        with self._lock:
+            stages = {name: self._percentiles(s, 1000.0) for name, s in self._stages.items() if s}
+            gauges = {name: self._percentiles(s) for name, s in self._gauges.items() if s}
+            counters = dict(self.counters)
+        summary = {'time': time.time(), 'uptime_s': time.time() - self.started, 'interval_ms': self.interval * 1000.0,
+                   'counters': counters, 'stages_ms': stages, 'gauges': gauges}
+        if self.startup is not None:
+            summary['startup_ms'] = self.startup
+        return summary
+
+    def dump(self, path):
+        # One JSON object per line, so a session log can be appended to and compared later.
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.summary()) + '\n')
+
+
+class StartupTimer:
+    """
+    Wall-clock milestones from process start to the first drawn frame.
+
+    `mark(name)` records the time spent since the previous mark under `name`; `report()` returns
+    them in ms with the total and logs one line, only the first time it is called.
+    """
+
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+        self.stages = {}
+        self.reported = False
+
+    def reset(self, start):
+        self.start = self._last = start
+        self.stages = {}
+        self.reported = False
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + (now - self._last) * 1000.0
+        self._last = now
+
+    def report(self):
+        if self.reported:
+            return None
+        self.reported = True
+        report = dict(self.stages, total=(self._last - self.start) * 1000.0)
+        logging.info("Startup (ms): %s", " | ".join(f"{k} {v:.0f}" for k, v in report.items()))
+        return report
+
+
+# Process-wide, so the entry point, controller and plot manager can mark milestones without
+# threading a timer through every constructor.
+STARTUP = StartupTimer()
+
+
+def format_summary(summary):
+    """HTML table of a `Profiler.summary()` for the on-screen panel."""
+    rows = ["<tr><th align='left'>stage</th><th>p50</th><th>p95</th><th>max</th></tr>"]
+    for name, s in summary['stages_ms'].items():
+        rows.append(f"<tr><td>{name}</td><td align='right'>{s['p50']:.1f}</td>"
+                    f"<td align='right'>{s['p95']:.1f}</td><td align='right'>{s['max']:.1f}</td></tr>")
+    for name, s in summary['gauges'].items():
+        rows.append(f"<tr><td><i>{name}</i></td><td align='right'>{s['p50']:.0f}</td>"
+                    f"<td align='right'>{s['p95']:.0f}</td><td align='right'>{s['max']:.0f}</td></tr>")
+    counters = " | ".join(f"{k.replace('_', ' ')}: {v}" for k, v in summary['counters'].items())
+    return (f"<b>Profile</b> (ms, last {max([s['n'] for s in summary['stages_ms'].values()] or [0])} samples, "
+            f"tick {summary['interval_ms']:.0f} ms)<table cellspacing='4'>{''.join(rows)}</table>{counters}")
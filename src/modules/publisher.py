@@ -0,0 +1,378 @@
+# publisher.py
+"""
+Local streaming output: the viewer's filtered blocks, PSDs and quality metrics as binary frames
+over TCP or a Unix socket, for other tools to consume without recomputing them.
+
+Every frame is a 32-byte header followed by a little-endian payload:
+
+    header   '<4sBBHIIIqI'  b'EVS1', kind, decimation, generation, seq, rows, columns, first sample,
+                            payload bytes
+    HELLO    JSON stream description (channel names, sampling rate, PSD frequencies, metric fields),
+             or {"error": ...} before the server closes a connection whose subscription was invalid
+    SAMPLES  float32 (rows x columns): montage channels x samples, real-time filtered; `first sample`
+             is the absolute index of column 0 at the full rate, every `decimation`-th sample is kept
+             after an anti-alias low-pass (8th-order Butterworth at 0.8 of the new Nyquist)
+    PSD      uint32 channel indices (rows), then float32 (rows x frequency bins)
+    METRICS  float32 (rows x len(METRIC_FIELDS)); NaN where not computed, statuses as list indices
+    PROFILE  JSON `Profiler.summary()`, once a second
+
+`seq` counts the published items of each kind separately (HELLO is 0), so a gap in one kind's
+numbers means frames of that kind were dropped for that client, whatever kinds it subscribed to;
+`generation` changes when playback jumps and sample indices restart.
+"""
+import asyncio
+import json
+import logging
+import socket
+import struct
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+FRAME = struct.Struct('<4sBBHIIIqI')
+MAGIC = b'EVS1'
+HELLO, SAMPLES, PSD, METRICS, PROFILE = range(5)
+KINDS = {'samples': SAMPLES, 'psd': PSD, 'metrics': METRICS, 'profile': PROFILE}
+DEFAULT_TYPES = ('samples', 'psd', 'metrics')
+
+QUALITY_FIELDS = ('ptp', 'rms', 'dc', 'flat', 'kurtosis', 'skew')
+BAND_FIELDS = ('delta', 'theta', 'alpha', 'beta', 'high_beta', 'gamma', 'high_gamma')
+METRIC_FIELDS = QUALITY_FIELDS + ('status', 'lnr', 'mr', 'entropy') + BAND_FIELDS + ('spectral_status',)
+QUALITY_STATUSES = ('OK', 'FLAT', 'NOISY', 'HIGH RMS', 'SPIKY')
+SPECTRAL_STATUSES = ('human EEG alike', 'RANDOM NOISE alike', 'UNKNOWN')
+
+
+def parse_address(address):
+    """('unix', path) for anything containing a '/', else ('tcp', (host, port)); host defaults to localhost."""
+    if '/' in address:
+        return 'unix', address
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def _status_code(statuses, status):
+    return statuses.index(status) if status in statuses else -1
+
+
+def metrics_matrix(metrics):
+    """(channels x METRIC_FIELDS) float32 of a snapshot's metrics tuple."""
+    out = np.full((len(metrics), len(METRIC_FIELDS)), np.nan, dtype=np.float32)
+    for i, m in enumerate(metrics):
+        if m is None:
+            continue
+        out[i, :6] = [m[k] for k in QUALITY_FIELDS]
+        out[i, 6] = _status_code(QUALITY_STATUSES, m['status'])
+        if 'bands' in m:
+            out[i, 7:10] = m['lnr'], m['mr'], m['entropy']
+            out[i, 10:17] = m['bands']
+            out[i, 17] = _status_code(SPECTRAL_STATUSES, m['spectral_status'])
+    return out
+
+
+@lru_cache(maxsize=16)
+def _antialias_sos(decimation):
+    from scipy.signal import butter  # only needed once a client asks for decimated samples
+
+    return butter(8, 0.8 / decimation, output='sos')
+
+
+def _frame(kind, seq, array, first=0, generation=0, decimation=1, prefix=b''):
+    payload = prefix + np.ascontiguousarray(array, dtype=np.float32).tobytes()
+    rows, columns = array.shape
+    return FRAME.pack(MAGIC, kind, decimation, generation & 0xFFFF, seq & 0xFFFFFFFF, rows, columns, first,
+                      len(payload)) + payload
+
+
+def _json_frame(kind, seq, obj):
+    payload = json.dumps(obj).encode('utf-8')
+    return FRAME.pack(MAGIC, kind, 1, 0, seq & 0xFFFFFFFF, 0, 0, 0, len(payload)) + payload
+
+
+class _Client:
+    def __init__(self, writer, types, decimation, channels, queue_frames):
+        self.writer = writer
+        self.kinds = {KINDS[t] for t in types}
+        self.decimation = decimation
+        self.channels = channels  # montage indices, or None for all
+        self.queue = asyncio.Queue(maxsize=queue_frames)
+        self.dropped = 0
+
+    def push(self, frame):
+        # Never waits: a client that cannot keep up loses its oldest frames.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class StreamPublisher:
+    """
+    Serves frames to any number of local clients from an asyncio loop in a background thread.
+
+    `publish_*` are called from the processing worker; they convert to float32 once and hand off to
+    the loop, which slices per client (channel subset, decimation) and queues one shared frame per
+    distinct subscription. Each client has a queue of `queue_frames`; while it is full the oldest
+    frame is dropped (counted in the profiler as `publish_dropped`), so a slow consumer never slows
+    the viewer or the other clients. Socket writes wait on `drain()`, i.e. on TCP flow control.
+
+    A client may send one JSON line within `subscribe_timeout` seconds of connecting, e.g.
+    {"types": ["samples", "metrics"], "decimate": 4, "channels": ["C3", 5]} (names or 0-based montage
+    indices); otherwise it gets samples, PSDs and metrics of all channels at the full rate. An
+    invalid subscription (unknown type or channel, index out of range) is answered with an error
+    HELLO and the connection is closed. Decimated samples are low-pass filtered first, once per
+    decimation factor for all clients, with filter state carried from block to block.
+    """
+
+    def __init__(self, address, profiler=None, queue_frames=256, subscribe_timeout=0.5):
+        self.address = address
+        self.profiler = profiler
+        self.queue_frames = queue_frames
+        self.subscribe_timeout = subscribe_timeout
+        self.info = {}
+        self.clients = set()
+        self._kinds = frozenset()  # union of the clients' kinds, read by the worker thread
+        self._decimators = {}  # decimation -> [generation, sosfilt state] of the anti-alias filter
+        self._seq = dict.fromkeys(KINDS.values(), 0)  # kind -> last seq
+        self._server = None
+        self._error = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='StreamPublisher', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+
+    def set_stream_info(self, names, sampling_rate, freqs):
+        self.info = {'version': 1, 'channels': list(names), 'sampling_rate': sampling_rate,
+                     'freqs': [float(f) for f in freqs], 'metric_fields': list(METRIC_FIELDS),
+                     'quality_statuses': list(QUALITY_STATUSES), 'spectral_statuses': list(SPECTRAL_STATUSES),
+                     'kinds': {'hello': HELLO, **KINDS}}
+
+    def wants(self, kind):
+        return kind in self._kinds
+
+    # Worker side
+    def _next_seq(self, kind):
+        self._seq[kind] += 1
+        return self._seq[kind]
+
+    def publish_samples(self, first_sample, block, generation=0):
+        if block.shape[1] and self.wants(SAMPLES):
+            data = block.astype(np.float32)
+            self._loop.call_soon_threadsafe(self._broadcast_samples, self._next_seq(SAMPLES), first_sample, data, generation)
+
+    def publish_psd(self, channels, psd, generation=0):
+        if len(channels) and self.wants(PSD):
+            data = psd.astype(np.float32)
+            self._loop.call_soon_threadsafe(self._broadcast_psd, self._next_seq(PSD), list(channels), data, generation)
+
+    def publish_metrics(self, metrics, generation=0):
+        if self.wants(METRICS):
+            self._loop.call_soon_threadsafe(self._broadcast_rows, METRICS, self._next_seq(METRICS), metrics_matrix(metrics),
+                                            generation)
+
+    def close(self):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+
+    # Loop thread
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            kind, target = parse_address(self.address)
+            if kind == 'unix':
+                server = asyncio.start_unix_server(self._serve, path=target)
+            else:
+                server = asyncio.start_server(self._serve, *target)
+            self._server = self._loop.run_until_complete(server)
+            self._loop.create_task(self._profile_loop())
+            logging.info("Publishing on %s", self.address)
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def _set_clients(self, add=None, remove=None):
+        if add is not None:
+            self.clients.add(add)
+        if remove is not None:
+            self.clients.discard(remove)
+        self._kinds = frozenset(k for c in self.clients for k in c.kinds)
+        factors = {c.decimation for c in self.clients}
+        self._decimators = {d: state for d, state in self._decimators.items() if d in factors}
+
+    def _channel_index(self, spec):
+        names = self.info.get('channels', [])
+        if spec in names:
+            return names.index(spec)
+        if isinstance(spec, int) and not isinstance(spec, bool) and 0 <= spec < len(names):
+            return spec
+        raise ValueError(f"unknown channel {spec!r} (names or indices 0..{len(names) - 1})")
+
+    async def _subscription(self, reader):
+        # (types, decimation, channels); raises ValueError for a subscription that cannot be served.
+        types, decimation, channels = DEFAULT_TYPES, 1, None
+        try:
+            line = await asyncio.wait_for(reader.readline(), self.subscribe_timeout)
+        except asyncio.TimeoutError:
+            return types, decimation, channels
+        try:
+            request = json.loads(line) if line.strip() else {}
+            types = list(request.get('types', types))
+            decimation = int(request.get('decimate', 1))
+            if request.get('channels') is not None:
+                channels = [self._channel_index(c) for c in request['channels']]
+        except (TypeError, AttributeError) as e:
+            raise ValueError(f"malformed subscription: {e}") from e
+        unknown = [t for t in types if t not in KINDS]
+        if unknown:
+            raise ValueError(f"unknown types {unknown} (one of {', '.join(KINDS)})")
+        if not 1 <= decimation <= 255:
+            raise ValueError("decimate must be between 1 and 255")
+        return types, decimation, channels
+
+    async def _serve(self, reader, writer):
+        peer = writer.get_extra_info('peername') or 'unix client'
+        try:
+            types, decimation, channels = await self._subscription(reader)
+        except ValueError as e:  # json.JSONDecodeError included
+            logging.warning("Publisher: rejected subscription from %s: %s", peer, e)
+            writer.write(_json_frame(HELLO, 0, {'error': str(e)}))
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+            return
+        client = _Client(writer, types, decimation, channels, self.queue_frames)
+        client.push(_json_frame(HELLO, 0, dict(self.info, types=types, decimate=decimation,
+                                               subscribed_channels=channels)))
+        self._set_clients(add=client)
+        logging.info("Publisher: %s subscribed to %s (decimation %d)", peer, ', '.join(types), decimation)
+        try:
+            while True:
+                frame = await client.queue.get()
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._set_clients(remove=client)
+            writer.close()
+            logging.info("Publisher: %s disconnected (%d frames dropped)", peer, client.dropped)
+
+    def _deliver(self, kind, build):
+        # One frame per distinct channel subset / decimation, shared by the clients that asked for it.
+        frames = {}
+        for client in list(self.clients):
+            if kind not in client.kinds:
+                continue
+            key = (tuple(client.channels) if client.channels is not None else None, client.decimation)
+            if key not in frames:
+                try:
+                    frames[key] = build(client.channels, client.decimation)
+                except Exception:  # never let one subscription stop delivery to the others
+                    logging.exception("Publisher: building a frame for %s failed", key)
+                    frames[key] = None
+            if frames[key] is None:
+                continue
+            before = client.dropped
+            client.push(frames[key])
+            if client.dropped != before and self.profiler is not None:
+                self.profiler.count('publish_dropped')
+
+    def _antialias(self, decimation, data, generation):
+        # Low-passes every row once per block and decimation factor; state restarts with a new generation.
+        from scipy.signal import sosfilt, sosfilt_zi
+
+        sos = _antialias_sos(decimation)
+        state = self._decimators.get(decimation)
+        if state is None or state[0] != generation or state[1].shape[1] != data.shape[0]:
+            state = [generation, sosfilt_zi(sos)[:, None, :] * data[None, :, :1]]
+        filtered, state[1] = sosfilt(sos, data, axis=1, zi=state[1])
+        self._decimators[decimation] = state
+        return filtered.astype(np.float32)
+
+    def _broadcast_samples(self, seq, first, data, generation):
+        filtered = {1: data}
+
+        def build(channels, decimation):
+            if decimation not in filtered:
+                filtered[decimation] = self._antialias(decimation, data, generation)
+            rows = filtered[decimation] if channels is None else filtered[decimation][channels]
+            offset = -first % decimation
+            return _frame(SAMPLES, seq, rows[:, offset::decimation], first + offset, generation, decimation)
+        self._deliver(SAMPLES, build)
+
+    def _broadcast_psd(self, seq, channels, data, generation):
+        def build(wanted, _):
+            keep = [j for j, i in enumerate(channels) if wanted is None or i in wanted]
+            if not keep:
+                return None
+            index = np.asarray([channels[j] for j in keep], dtype=np.uint32)
+            return _frame(PSD, seq, data[keep], generation=generation, prefix=index.tobytes())
+        self._deliver(PSD, build)
+
+    def _broadcast_rows(self, kind, seq, data, generation):
+        self._deliver(kind, lambda channels, _: _frame(kind, seq, data if channels is None else data[channels],
+                                                       generation=generation))
+
+    async def _profile_loop(self):
+        while True:
+            await asyncio.sleep(1.0)
+            if self.profiler is not None and self.wants(PROFILE):
+                frame = _json_frame(PROFILE, self._next_seq(PROFILE), self.profiler.summary())
+                self._deliver(PROFILE, lambda *_: frame)
+
+
+def subscribe(address, types=DEFAULT_TYPES, decimate=1, channels=None, timeout=None):
+    """
+    Minimal blocking client: yields (kind, header dict, payload) with payload decoded to numpy
+    (PSD as (channel indices, psd)) or, for HELLO and PROFILE, to a dict.
+    """
+    kind, target = parse_address(address)
+    sock = socket.socket(socket.AF_UNIX if kind == 'unix' else socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(target)
+    request = {'types': list(types), 'decimate': decimate}
+    if channels is not None:
+        request['channels'] = list(channels)
+    sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+    stream = sock.makefile('rb')
+    try:
+        while True:
+            head = stream.read(FRAME.size)
+            if len(head) < FRAME.size:
+                return
+            magic, kind, decimation, generation, seq, rows, columns, first, length = FRAME.unpack(head)
+            if magic != MAGIC:
+                raise ValueError("Not an EVS1 stream")
+            payload = stream.read(length)
+            header = {'seq': seq, 'generation': generation, 'first_sample': first, 'decimation': decimation}
+            if kind in (HELLO, PROFILE):
+                yield kind, header, json.loads(payload.decode('utf-8'))
+            elif kind == PSD:
+                index = np.frombuffer(payload[:4 * rows], dtype=np.uint32)
+                yield kind, header, (index, np.frombuffer(payload[4 * rows:], dtype=np.float32).reshape(rows, columns))
+            else:
+                yield kind, header, np.frombuffer(payload, dtype=np.float32).reshape(rows, columns)
+    finally:
+        stream.close()
+        sock.close()
@@ -0,0 +1,198 @@
+# quality.py
+"""
+Streaming signal-quality statistics updated from new samples only.
+"""
+from collections import deque
+from math import comb
+
+import numpy as np
+
+from modules.stream import RingBuffer
+
+ORDER = 4  # highest moment (kurtosis)
+
+# Expansion of sum((d - alpha - beta * u)^k) into the sums of d^i * u^j: one row per term,
+# (k - 1, i, j, power of alpha, power of beta, coefficient).
+_TERMS = np.array([(k - 1, k - m, l, m - l, l, comb(k, m) * comb(m, l) * (-1) ** m)
+                   for k in range(1, ORDER + 1) for m in range(k + 1) for l in range(m + 1)])
+
+
+class RunningStats:
+    """
+    Windowed PTP, RMS, DC, flatness, kurtosis and skew for every channel.
+
+    The sums of d^i * u^j (i + j <= 4) are updated by adding the samples that enter the window and
+    subtracting the ones that leave, where d is the sample minus a per-channel shift and u its time
+    in windows since an origin; both are re-centred by an exact recomputation once per window.
+    These sums give the moments of the raw signal and, through the least-squares line, of the
+    linearly detrended signal (as scipy.signal.detrend), so DC, RMS, skew and kurtosis are exact in
+    both cases. PTP comes from per-block min/max summaries (only the oldest, partially expired block
+    is ever rescanned) and flatness from a rolling count of |diff| < threshold. All updates are
+    vectorised across channels.
+
+    With `detrended`, the block summaries bound where the extremes of the detrended signal can lie
+    and only the blocks that may hold them are rescanned, so PTP stays exact. Flatness is an
+    approximation: it counts the raw differences, which differ from the detrended ones by the slope
+    per sample (a fraction of a µV for slow drift).
+    """
+
+    def __init__(self, num_channels, window, flat_threshold=3.0):
+        self.num_channels = num_channels
+        self.window = window
+        self.flat_threshold = flat_threshold
+        self.reset()
+
+    def reset(self):
+        self.samples = RingBuffer(self.num_channels, self.window)
+        self.flags = RingBuffer(self.num_channels, self.window)
+        self.shift = np.zeros((self.num_channels, 1))
+        self.origin = 0  # absolute sample index where u = 0
+        self.sums = np.zeros((ORDER + 1, ORDER + 1, self.num_channels))  # [i, j]: sum of d^i * u^j
+        self.flat_count = np.zeros(self.num_channels)
+        self.last = None
+        self.blocks = deque()  # (abs_start, abs_end, min, max, abs index of min, abs index of max)
+        self._since_resync = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def _power_sums(self, block, first):
+        # (ORDER + 1, ORDER + 1, channels) sums of d^i * u^j for samples starting at absolute index `first`.
+        n = block.shape[1]
+        d_pow = np.empty((ORDER + 1, self.num_channels, n))
+        u_pow = np.empty((ORDER + 1, n))
+        d_pow[0], d_pow[1] = 1.0, block - self.shift
+        u_pow[0], u_pow[1] = 1.0, (first - self.origin + np.arange(n)) / self.window
+        for p in range(2, ORDER + 1):
+            d_pow[p] = d_pow[p - 1] * d_pow[1]
+            u_pow[p] = u_pow[p - 1] * u_pow[1]
+        # One 2-D product (BLAS) rather than a batched matmul.
+        return (d_pow.reshape(-1, n) @ u_pow.T).reshape(ORDER + 1, self.num_channels, ORDER + 1).transpose(0, 2, 1)
+
+    def _flags(self, block):
+        prev = self.last if self.last is not None else block[:, :1]
+        return (np.abs(np.diff(block, axis=1, prepend=prev)) < self.flat_threshold).astype(np.float64)
+
+    @staticmethod
+    def _summary(block, first):
+        return (first, first + block.shape[1], block.min(axis=1), block.max(axis=1),
+                first + block.argmin(axis=1), first + block.argmax(axis=1))
+
+    def _resync(self):
+        # Exact recomputation once per window: bounds rounding drift and re-centres shift and origin.
+        window = self.samples.latest()
+        self.origin = self.samples.total - window.shape[1]
+        self.shift = window.mean(axis=1, keepdims=True)
+        self.sums = self._power_sums(window, self.origin)
+        self.flat_count = self.flags.latest().sum(axis=1)
+        self._since_resync = 0
+
+    def update(self, block):
+        n = block.shape[1]
+        if n == 0:
+            return
+        if n > self.window:
+            prev = block[:, -self.window - 1:-self.window]
+            self.reset()
+            self.last = prev
+            block = block[:, -self.window:]
+            n = self.window
+
+        first = self.samples.total
+        if len(self.samples) == 0:
+            self.shift = block.mean(axis=1, keepdims=True)
+            self.origin = first
+        n_leave = max(0, len(self.samples) + n - self.window)
+        new_flags = self._flags(block)
+        if self.last is None:
+            new_flags[:, 0] = 0.0
+        if n_leave:
+            self.sums -= self._power_sums(self.samples.oldest(n_leave), first - len(self.samples))
+            self.flat_count -= self.flags.oldest(n_leave).sum(axis=1)
+        self.sums += self._power_sums(block, first)
+        self.flat_count += new_flags.sum(axis=1)
+
+        self.samples.extend(block)
+        self.flags.extend(new_flags)
+        self.last = block[:, -1:]
+
+        total = self.samples.total
+        self.blocks.append(self._summary(block, first))
+        start = total - len(self.samples)
+        while self.blocks and self.blocks[0][1] <= start:
+            self.blocks.popleft()
+        first_start, first_end = self.blocks[0][:2]
+        if first_start < start:
+            self.blocks[0] = self._summary(self.samples.oldest(first_end - start), start)
+
+        self._since_resync += n
+        if self._since_resync >= self.window:
+            self._resync()
+
+    def _detrended_moments(self, e):
+        # Raw moments of d - (alpha + beta * u) about the least-squares line, from the mean sums e[i, j].
+        beta = (e[1, 1] - e[1, 0] * e[0, 1]) / np.maximum(e[0, 2] - e[0, 1] ** 2, 1e-300)
+        alpha = e[1, 0] - beta * e[0, 1]
+        k, i, j, a, b, coef = _TERMS.T
+        powers = np.arange(ORDER + 1)[:, None]
+        terms = coef[:, None] * (alpha ** powers)[a] * (beta ** powers)[b] * e[i, j]
+        moments = np.zeros((ORDER, self.num_channels))
+        np.add.at(moments, k, terms)
+        return moments, beta / self.window
+
+    def result(self, detrended=False):
+        """
+        Statistics over the current window as arrays of shape (channels,), as SignalProcessor.quality
+        gives them for the window, or for the linearly detrended window with `detrended`.
+        """
+        n = len(self.samples)
+        if n < 2:
+            return None
+        e = self.sums / n
+        if detrended:
+            (s1, s2, s3, s4), slope = self._detrended_moments(e)
+        else:
+            s1, s2, s3, s4 = e[1:, 0]
+            slope = np.zeros(self.num_channels)
+        m2 = np.maximum(s2 - s1 ** 2, 0.0)
+        m3 = s3 - 3 * s1 * s2 + 2 * s1 ** 3
+        m4 = s4 - 4 * s1 * s3 + 6 * s1 ** 2 * s2 - 3 * s1 ** 4
+        with np.errstate(divide='ignore', invalid='ignore'):
+            skewness = np.where(m2 > 0, m3 / m2 ** 1.5, np.nan)
+            kurt = np.where(m2 > 0, m4 / m2 ** 2 - 3.0, np.nan)
+
+        if detrended:
+            dc = s1
+            rms = np.sqrt(np.maximum(s2, 0.0))
+        else:
+            shift = self.shift[:, 0]
+            dc = s1 + shift
+            rms = np.sqrt(np.maximum(s2 + 2 * shift * s1 + shift ** 2, 0.0))
+
+        flat = (self.flat_count - self.flags.oldest(1)[:, 0]) / (n - 1)
+        return {'ptp': self._ptp(slope if detrended else None), 'rms': rms, 'dc': dc, 'flat': flat,
+                'kurtosis': kurt, 'skew': skewness}
+
+    def _ptp(self, slope=None):
+        # Peak-to-peak of x, or of x - slope * index when a per-sample slope is given.
+        starts, ends, mins, maxs, imins, imaxs = (np.array(column) for column in zip(*self.blocks))
+        if slope is None:
+            return maxs.max(axis=0) - mins.min(axis=0)
+        # Per block and channel: the value at the raw extreme is reached, the raw extreme with the
+        # most favourable line offset inside the block bounds it. Only blocks whose bound beats the
+        # best reached value for some channel can change the result.
+        line_first, line_last = np.outer(starts, slope), np.outer(ends - 1, slope)
+        high_bound = maxs - np.minimum(line_first, line_last)
+        low_bound = mins - np.maximum(line_first, line_last)
+        high_reached = (maxs - slope * imaxs).max(axis=0)
+        low_reached = (mins - slope * imins).min(axis=0)
+        candidates = np.flatnonzero(((high_bound > high_reached) | (low_bound < low_reached)).any(axis=1))
+        if len(candidates) > len(starts) // 4:
+            candidates = [None]  # one vectorised pass over the window beats many small ones
+        highs, lows = high_reached, low_reached
+        for k in candidates:
+            start, end = (starts[0], ends[-1]) if k is None else (starts[k], ends[k])
+            values = self.samples.between(start, end) - np.outer(slope, np.arange(start, end))
+            highs = np.maximum(highs, values.max(axis=1))
+            lows = np.minimum(lows, values.min(axis=1))
+        return highs - lows
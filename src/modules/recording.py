@@ -0,0 +1,231 @@
+# recording.py
+"""
+Compact binary recording container (.eegbin) with memory-mapped, random-access reading.
+
+Layout: 8-byte magic, little-endian uint32 header length, UTF-8 JSON header, zero padding up to a
+64-byte boundary, then float32 samples stored channel-major as (num_rows, num_samples). Row order
+matches BrainFlow's board data, so `exg`, `timestamp` and `marker` indices from the board
+description apply directly. The timestamp row is stored relative to `timestamp_offset` so that
+float32 keeps sub-millisecond resolution.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'EEGBIN1\0'
+ALIGN = 64
+
+
+def _coerce(value):
+    value = value.strip().rstrip(',').strip().strip('"\'')
+    lowered = value.lower()
+    if lowered in ('null', 'none', ''):
+        return None
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_metadata(text):
+    """Parses the indented `Key: value` structure of a recordings/*_metadata.txt sidecar into nested dicts."""
+    root = {}
+    stack = [(-1, root)]
+    for raw in text.splitlines():
+        line = raw.split(' #')[0].rstrip()
+        stripped = line.strip()
+        if not stripped or stripped.startswith(('#', '|', '*')) or ':' not in stripped:
+            continue
+        indent = len(line) - len(line.lstrip())
+        key, _, value = stripped.partition(':')
+        while indent <= stack[-1][0]:
+            stack.pop()
+        if value.strip():
+            stack[-1][1][key.strip()] = _coerce(value)
+        else:
+            child = {}
+            stack[-1][1][key.strip()] = child
+            stack.append((indent, child))
+    return root
+
+
+def find_metadata_file(path):
+    # Sidecars are named after the session prefix, e.g. 250516-1702_metadata.txt next to
+    # 250516-1702_FREEEEG32_BOARD_....csv
+    folder = os.path.dirname(path) or '.'
+    prefix = os.path.basename(path).split('_')[0]
+    candidate = os.path.join(folder, f"{prefix}_metadata.txt")
+    return candidate if os.path.exists(candidate) else None
+
+
+def build_header(sampling_rate, num_rows, board_id=None, board_descr=None, metadata_path=None,
+                 timestamp_offset=0.0):
+    header = {
+        'version': 1,
+        'sampling_rate': sampling_rate,
+        'num_rows': num_rows,
+        'num_samples': 0,
+        'board_id': board_id,
+        'board_descr': board_descr or {},
+        'timestamp_offset': timestamp_offset,
+        'metadata': {},
+        'metadata_text': '',
+    }
+    if metadata_path:
+        with open(metadata_path, encoding='utf-8', errors='replace') as f:
+            header['metadata_text'] = f.read()
+        header['metadata'] = parse_metadata(header['metadata_text'])
+    return header
+
+
+def write_header(f, header, magic=MAGIC):
+    blob = json.dumps(header).encode('utf-8')
+    f.write(magic)
+    f.write(struct.pack('<I', len(blob)))
+    f.write(blob)
+    pad = -(len(magic) + 4 + len(blob)) % ALIGN
+    f.write(b'\0' * pad)
+    return f.tell()
+
+
+def read_header(path, magic=MAGIC):
+    with open(path, 'rb') as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not an {'.eegbin' if magic == MAGIC else '.eegstream'} recording")
+        (length,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(length).decode('utf-8'))
+        offset = len(magic) + 4 + length
+    return header, offset + (-offset % ALIGN)
+
+
+def timestamp_row(header):
+    row = header.get('board_descr', {}).get('timestamp_channel')
+    return row if isinstance(row, int) else None
+
+
+class BinaryRecorder:
+    """
+    Appends incoming board data blocks and produces an .eegbin file on close().
+
+    Blocks are spooled sample-major to `<path>.part` while recording (channel-major needs the final
+    length), then transposed into place in bounded chunks.
+    """
+
+    def __init__(self, path, sampling_rate, num_rows, board_id=None, board_descr=None, metadata_path=None,
+                 chunk_samples=1 << 16):
+        self.path = path
+        self.spool_path = path + '.part'
+        self.header = build_header(sampling_rate, num_rows, board_id, board_descr, metadata_path)
+        self.chunk_samples = chunk_samples
+        self.num_samples = 0
+        self._spool = open(self.spool_path, 'wb')
+
+    def write(self, data):
+        if data.shape[1] == 0:
+            return
+        block = np.asarray(data, dtype=np.float64)
+        ts = timestamp_row(self.header)
+        if ts is not None:
+            if self.num_samples == 0:
+                self.header['timestamp_offset'] = float(block[ts, 0])
+            block = block.copy()
+            block[ts] -= self.header['timestamp_offset']
+        self._spool.write(np.ascontiguousarray(block.T, dtype=np.float32).tobytes())
+        self.num_samples += block.shape[1]
+
+    def close(self):
+        if self._spool is None:
+            return
+        self._spool.close()
+        self._spool = None
+        rows = self.header['num_rows']
+        self.header['num_samples'] = self.num_samples
+        with open(self.path, 'wb') as f:
+            offset = write_header(f, self.header)
+        if self.num_samples:
+            spool = np.memmap(self.spool_path, dtype=np.float32, mode='r', shape=(self.num_samples, rows))
+            out = np.memmap(self.path, dtype=np.float32, mode='r+', offset=offset,
+                            shape=(rows, self.num_samples))
+            for start in range(0, self.num_samples, self.chunk_samples):
+                stop = min(start + self.chunk_samples, self.num_samples)
+                out[:, start:stop] = spool[start:stop].T
+            out.flush()
+            del spool, out
+        os.remove(self.spool_path)
+
+
+class RecordingReader:
+    """Zero-copy access to an .eegbin file; slicing returns views into the memory map."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header, offset = read_header(path)
+        self.sampling_rate = self.header['sampling_rate']
+        self.num_rows = self.header['num_rows']
+        self.num_samples = self.header['num_samples']
+        self.board_id = self.header.get('board_id')
+        self.board_descr = self.header.get('board_descr', {})
+        self.metadata = self.header.get('metadata', {})
+        self.timestamp_row = timestamp_row(self.header)
+        if self.num_samples:
+            self.data = np.memmap(path, dtype=np.float32, mode='r', offset=offset,
+                                  shape=(self.num_rows, self.num_samples))
+        else:
+            self.data = np.zeros((self.num_rows, 0), dtype=np.float32)
+
+    @property
+    def duration(self):
+        return self.num_samples / self.sampling_rate
+
+    def index_at(self, seconds):
+        return int(np.clip(round(seconds * self.sampling_rate), 0, self.num_samples))
+
+    def samples(self, start, stop, rows=None):
+        return self.data[:, start:stop] if rows is None else self.data[rows, start:stop]
+
+    def window(self, start_s, end_s, rows=None):
+        return self.samples(self.index_at(start_s), self.index_at(end_s), rows)
+
+    def board_data(self, start, stop):
+        # float64 copy shaped like BrainFlow's get_board_data(), with absolute timestamps restored.
+        data = np.array(self.data[:, start:stop], dtype=np.float64)
+        if self.timestamp_row is not None:
+            data[self.timestamp_row] += self.header['timestamp_offset']
+        return data
+
+
+def convert_csv(csv_path, out_path, sampling_rate, board_id=None, board_descr=None, metadata_path=None,
+                chunk_samples=1 << 16):
+    """Converts a BrainFlow CSV to .eegbin in bounded memory: one pass to count, one to fill."""
+    from modules.batch import iter_csv_chunks
+
+    with open(csv_path) as f:
+        num_samples = sum(1 for line in f if line.strip())
+    first = next(iter_csv_chunks(csv_path, 1), None)
+    if first is None:
+        raise ValueError(f"{csv_path} is empty")
+    num_rows = first.shape[0]
+
+    header = build_header(sampling_rate, num_rows, board_id, board_descr, metadata_path)
+    ts = timestamp_row(header)
+    if ts is not None:
+        header['timestamp_offset'] = float(first[ts, 0])
+    header['num_samples'] = num_samples
+    with open(out_path, 'wb') as f:
+        offset = write_header(f, header)
+    out = np.memmap(out_path, dtype=np.float32, mode='r+', offset=offset, shape=(num_rows, num_samples))
+    pos = 0
+    for chunk in iter_csv_chunks(csv_path, chunk_samples):
+        if ts is not None:
+            chunk[ts] -= header['timestamp_offset']
+        out[:, pos:pos + chunk.shape[1]] = chunk
+        pos += chunk.shape[1]
+    out.flush()
+    del out
+    return out_path
@@ -0,0 +1,42 @@
+# rendering.py
+"""
+Pixel-aware decimation of time-series traces before they are handed to pyqtgraph.
+"""
+import numpy as np
+
+
+class TraceDecimator:
+    """
+    Reduces a trace to at most two points (min and max) per horizontal pixel.
+
+    The envelope is preserved, so spikes stay visible however long the window is. X arrays
+    are cached per (length, bins) and reused across ticks.
+    """
+
+    def __init__(self):
+        self._x_cache = {}
+
+    def _x(self, n, bins, size):
+        key = (n, bins)
+        x = self._x_cache.get(key)
+        if x is None:
+            if bins is None:
+                x = np.arange(n, dtype=np.float64)
+            else:
+                x = np.repeat(np.arange(bins) * size + (size - 1) / 2.0, 2)
+            self._x_cache[key] = x
+        return x
+
+    def decimate(self, y, width_px):
+        n = len(y)
+        bins = max(1, int(width_px))
+        if n <= 2 * bins:
+            return self._x(n, None, 1), y
+        size = -(-n // bins)  # ceil
+        bins = -(-n // size)
+        padded = y if bins * size == n else np.pad(y, (0, bins * size - n), mode='edge')
+        blocks = padded.reshape(bins, size)
+        env = np.empty(2 * bins)
+        env[0::2] = blocks.min(axis=1)
+        env[1::2] = blocks.max(axis=1)
+        return self._x(n, bins, size), env
@@ -0,0 +1,76 @@
+# scheduler.py
+"""
+Update cadence for the processing worker: fast trace refresh, slower staggered metrics, and
+automatic slow-down when ticks do not fit their budget.
+"""
+import math
+
+
+class AdaptiveScheduler:
+    """
+    Traces are refreshed every `trace_interval_ms`; quality and spectral metrics of every channel are
+    refreshed once per `metrics_interval_ms`, spread over the ticks in between (channel `i` is handled
+    on ticks where `tick % groups == i % groups`).
+
+    Every `evaluate_every` ticks, `adapt(cost)` compares the measured per-tick cost (seconds; the
+    worker's p95 or the GUI's render+paint p95, whichever is larger) with the interval. Over
+    `budget` of the interval both intervals are scaled up by `step`; below `budget / 2` for
+    `recover_after` consecutive evaluations they are scaled back toward their targets, up to
+    `max_level` times the targets.
+    """
+
+    def __init__(self, trace_interval_ms=33, metrics_interval_ms=250, adaptive=True, budget=0.7, step=1.5,
+                 max_level=8.0, evaluate_every=30, recover_after=3):
+        self.target_trace_ms = trace_interval_ms
+        self.target_metrics_ms = max(metrics_interval_ms, trace_interval_ms)
+        self.adaptive = adaptive
+        self.budget = budget
+        self.step = step
+        self.max_level = max_level
+        self.evaluate_every = evaluate_every
+        self.recover_after = recover_after
+        self.level = 1.0
+        self.tick = 0
+        self._calm = 0
+
+    @property
+    def trace_interval_ms(self):
+        return int(round(self.target_trace_ms * self.level))
+
+    @property
+    def metrics_interval_ms(self):
+        return self.target_metrics_ms * self.level
+
+    @property
+    def groups(self):
+        return max(1, math.ceil(self.metrics_interval_ms / self.trace_interval_ms))
+
+    def advance(self):
+        self.tick += 1
+
+    def metric_channels(self, channels):
+        """The subset of `channels` whose metrics are due on the current tick."""
+        groups = self.groups
+        phase = self.tick % groups
+        return [i for i in channels if i % groups == phase]
+
+    def due_for_evaluation(self):
+        return self.adaptive and self.tick % self.evaluate_every == 0
+
+    def adapt(self, cost):
+        """Returns True when the trace interval changed and the timer has to be restarted."""
+        if cost is None:
+            return False
+        before = self.trace_interval_ms
+        interval = before / 1000.0
+        if cost > self.budget * interval and self.level < self.max_level:
+            self.level = min(self.level * self.step, self.max_level)
+            self._calm = 0
+        elif cost < 0.5 * self.budget * interval and self.level > 1.0:
+            self._calm += 1
+            if self._calm >= self.recover_after:
+                self.level = max(self.level / self.step, 1.0)
+                self._calm = 0
+        else:
+            self._calm = 0
+        return self.trace_interval_ms != before
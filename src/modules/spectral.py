@@ -0,0 +1,191 @@
+# spectral.py
+"""
+Spectral metrics shared by the live viewer and offline analysis.
+"""
+from collections import deque
+
+import numpy as np
+
+
+def default_psd_size(sampling_rate):
+    return max(64, min(1024, 2 ** int(np.log2(sampling_rate))))
+
+
+def safe_get_band_power(freqs, psd, freq_start, freq_end):
+    mask = (freqs >= freq_start) & (freqs <= freq_end)
+    if not np.any(mask):
+        return 0.0
+    return np.trapezoid(psd[mask], freqs[mask])
+
+
+def spectral_entropy(psd_values):
+    psd_values = np.array(psd_values, dtype=np.float64)
+    psd_norm = psd_values / (np.sum(psd_values) + 1e-10)
+    return -np.sum(psd_norm * np.log2(psd_norm + 1e-10))
+
+
+def line_noise_ratio(freqs, psd, target_freq=50.0, tol=1.0):
+    band = (freqs > target_freq - tol) & (freqs < target_freq + tol)
+    total_power = np.sum(psd[(freqs > 1) & (freqs < 45)]) + 1e-10
+    line_power = np.sum(psd[band])
+    return line_power / total_power
+
+
+BANDS = [(1.0, 4.0), (4.0, 8.0), (8.0, 13.0), (13.0, 20.0), (20.0, 30.0), (30.0, 60.0), (60.0, 100.0)]
+
+
+def trapezoid_weights(freqs, freq_start, freq_end):
+    """Weights w such that psd @ w == safe_get_band_power(freqs, psd, freq_start, freq_end)."""
+    weights = np.zeros(len(freqs))
+    idx = np.flatnonzero((freqs >= freq_start) & (freqs <= freq_end))
+    if len(idx) > 1:
+        dx = np.diff(freqs[idx])
+        weights[idx[:-1]] += dx / 2
+        weights[idx[1:]] += dx / 2
+    return weights
+
+
+# Cosine-sum coefficients of the windows used here.
+_COSINE_WINDOWS = {'hann': (0.5, 0.5), 'blackmanharris': (0.35875, 0.48829, 0.14128, 0.01168)}
+
+
+def cosine_window(name, n):
+    """Periodic (DFT-even) window, equal to scipy.signal.get_window(name, n) without importing scipy.signal."""
+    phase = 2.0 * np.pi * np.arange(n) / n
+    return sum((-1) ** k * a * np.cos(k * phase) for k, a in enumerate(_COSINE_WINDOWS[name]))
+
+
+class SpectralEngine:
+    """One Welch call for the whole montage; every band metric is a matrix product against precomputed weights."""
+
+    def __init__(self, sampling_rate, psd_size, line_freq=50.0, line_tol=1.0):
+        self.sampling_rate = sampling_rate
+        self.psd_size = psd_size
+        self.freqs = np.fft.rfftfreq(psd_size, 1.0 / sampling_rate)
+        self.band_weights = np.column_stack([trapezoid_weights(self.freqs, lo, hi) for lo, hi in BANDS])
+        self.line_mask = ((self.freqs > line_freq - line_tol) & (self.freqs < line_freq + line_tol)).astype(np.float64)
+        self.total_mask = ((self.freqs > 1) & (self.freqs < 45)).astype(np.float64)
+
+    def welch(self, block):
+        from scipy.signal import welch  # deferred: slow to import
+
+        _, psd = welch(block, fs=self.sampling_rate, nperseg=self.psd_size, window='blackmanharris', axis=-1)
+        return psd
+
+    def metrics(self, psd):
+        bands = psd @ self.band_weights
+        lnr = (psd @ self.line_mask) / (psd @ self.total_mask + 1e-10)
+        mr = (bands[:, 5] + bands[:, 6]) / (bands[:, 2] + bands[:, 3] + 1e-10)
+        psd_norm = psd / (psd.sum(axis=-1, keepdims=True) + 1e-10)
+        entropy = -np.sum(psd_norm * np.log2(psd_norm + 1e-10), axis=-1)
+        return {'bands': bands, 'lnr': lnr, 'mr': mr, 'entropy': entropy}
+
+    def compute(self, block):
+        psd = self.welch(np.atleast_2d(block))
+        return self.freqs, psd, self.metrics(psd)
+
+
+class IncrementalWelch:
+    """
+    Welch PSD maintained from cached per-segment periodograms.
+
+    Segments are `psd_size` long with 50 % overlap (scipy's welch defaults). Each call to `update`
+    only transforms the segments completed by the new samples; in 'sliding' mode the ones that fell
+    out of the analysis window are subtracted from a running sum, in 'ema' mode every new segment is
+    blended into an exponential average instead.
+    """
+
+    def __init__(self, sampling_rate, psd_size, num_channels, num_points, mode='sliding', alpha=0.2):
+        self.psd_size = psd_size
+        self.step = psd_size // 2
+        self.mode = mode
+        self.alpha = alpha
+        self.max_segments = max(1, (num_points - psd_size) // self.step + 1)
+        self.window = cosine_window('blackmanharris', psd_size)
+        self.scale = 1.0 / (sampling_rate * np.sum(self.window ** 2))
+        self.freqs = np.fft.rfftfreq(psd_size, 1.0 / sampling_rate)
+        self.pending = np.empty((num_channels, 0))
+        self.segments = deque()
+        self.running_sum = None
+        self._since_resync = 0
+        self.psd = None
+
+    def reset(self):
+        self.pending = self.pending[:, :0]
+        self.segments.clear()
+        self.running_sum = None
+        self._since_resync = 0
+        self.psd = None
+
+    def _periodograms(self, block):
+        # (channels, n_segments, psd_size) strided view -> one rfft for every new segment.
+        n_seg = (block.shape[1] - self.psd_size) // self.step + 1
+        segs = np.lib.stride_tricks.sliding_window_view(block, self.psd_size, axis=-1)[:, ::self.step][:, :n_seg]
+        segs = segs - segs.mean(axis=-1, keepdims=True)
+        spec = np.abs(np.fft.rfft(segs * self.window, axis=-1)) ** 2 * self.scale
+        spec[..., 1:-1] *= 2  # one-sided density; psd_size is even so the last bin is Nyquist
+        return spec, n_seg
+
+    def update(self, new_samples):
+        self.pending = np.concatenate((self.pending, new_samples), axis=1)
+        if self.pending.shape[1] < self.psd_size:
+            return self.psd
+        spec, n_seg = self._periodograms(self.pending)
+        self.pending = self.pending[:, n_seg * self.step:]
+
+        if self.mode == 'ema':
+            for k in range(n_seg):
+                seg = spec[:, k]
+                self.psd = seg.copy() if self.psd is None else (1 - self.alpha) * self.psd + self.alpha * seg
+            return self.psd
+
+        for k in range(n_seg):
+            seg = spec[:, k]
+            self.segments.append(seg)
+            self.running_sum = seg.copy() if self.running_sum is None else self.running_sum + seg
+            if len(self.segments) > self.max_segments:
+                self.running_sum -= self.segments.popleft()
+        self._since_resync += n_seg
+        if self._since_resync >= self.max_segments:
+            # Re-sum once per full window so add/subtract rounding never accumulates.
+            self.running_sum = np.sum(self.segments, axis=0)
+            self._since_resync = 0
+        self.psd = self.running_sum / len(self.segments)
+        return self.psd
+
+
+class RollingSTFT:
+    """
+    Short-time Fourier transform of a continuous stream: one column every `hop` samples over a
+    `nperseg`-sample Hann window, for the montage rows in `channels`.
+
+    `update` transforms only the segments completed by the new samples and returns their power
+    density in dB, shaped (channels, new columns, bins within `freq_range`), or None when no segment
+    was completed; columns already returned are never recomputed.
+    """
+
+    def __init__(self, sampling_rate, nperseg, hop, channels, freq_range=(1.0, 60.0)):
+        self.nperseg = nperseg
+        self.hop = hop
+        self.channels = list(channels)
+        self.window = cosine_window('hann', nperseg)
+        self.scale = 1.0 / (sampling_rate * np.sum(self.window ** 2))
+        freqs = np.fft.rfftfreq(nperseg, 1.0 / sampling_rate)
+        self.bins = np.flatnonzero((freqs >= freq_range[0]) & (freqs <= freq_range[1]))
+        self.bins = self.bins[(self.bins > 0) & (self.bins < len(freqs) - 1)]  # one-sided interior bins
+        self.freqs = freqs[self.bins]
+        self.pending = np.empty((len(self.channels), 0))
+
+    def reset(self):
+        self.pending = self.pending[:, :0]
+
+    def update(self, new_samples):
+        self.pending = np.concatenate((self.pending, new_samples[self.channels]), axis=1)
+        if self.pending.shape[1] < self.nperseg:
+            return None
+        n_seg = (self.pending.shape[1] - self.nperseg) // self.hop + 1
+        segs = np.lib.stride_tricks.sliding_window_view(self.pending, self.nperseg, axis=-1)[:, ::self.hop][:, :n_seg]
+        segs = segs - segs.mean(axis=-1, keepdims=True)
+        spec = np.abs(np.fft.rfft(segs * self.window, axis=-1)[..., self.bins]) ** 2 * (2 * self.scale)
+        self.pending = self.pending[:, n_seg * self.hop:]
+        return (10.0 * np.log10(spec + 1e-12)).astype(np.float32)
@@ -0,0 +1,87 @@
+# spectrogram.py
+"""
+Scrolling spectrogram panel fed with the worker's rolling STFT columns.
+"""
+from collections import namedtuple
+
+import numpy as np
+from PyQt5.QtCore import QRectF
+import pyqtgraph as pg
+
+# `channels` are montage names or 1-based montage positions; times are in seconds.
+SpectrogramSettings = namedtuple('SpectrogramSettings', ['channels', 'freq_range', 'history_seconds',
+                                                         'hop_seconds'])
+
+
+def resolve_channels(montage, specs):
+    """Montage indices for names or 1-based positions, e.g. ['C3', '5']."""
+    indices = []
+    for spec in specs:
+        if spec in montage.names:
+            indices.append(montage.names.index(spec))
+        elif spec.isdigit() and 1 <= int(spec) <= len(montage):
+            indices.append(int(spec) - 1)
+        else:
+            raise ValueError(f"Spectrogram channel {spec!r} is not in the montage ({', '.join(montage.names)})")
+    return indices
+
+
+class SpectrogramPanel:
+    """
+    One time-frequency image per selected channel, newest column on the right.
+
+    Columns are written into a preallocated ring that is stored twice side by side, so the last
+    `history` columns in time order are always one contiguous slice and a push costs only the new
+    columns. Colour levels follow a slow average of the new columns' 2nd and 99.5th percentiles.
+    """
+
+    def __init__(self, names, freqs, hop_seconds, history_columns, colormap='viridis'):
+        self.history = history_columns
+        self.widget = pg.GraphicsLayoutWidget()
+        self.widget.setMinimumHeight(140 * len(names))
+        self._ring = np.full((len(names), 2 * history_columns, len(freqs)), np.nan, dtype=np.float32)  # NaN: blank
+        self._head = 0  # index of the oldest column
+        self.levels = None
+        span = history_columns * hop_seconds
+        # Bin centres on the pixel centres.
+        df = freqs[1] - freqs[0] if len(freqs) > 1 else 1.0
+        rect = QRectF(-span, freqs[0] - df / 2, span, len(freqs) * df)
+
+        self.images = []
+        for row, name in enumerate(names):
+            plot = self.widget.addPlot(row=row, col=0)
+            plot.setLabel('left', f"{name} (Hz)")
+            plot.setMouseEnabled(x=False, y=True)
+            image = pg.ImageItem(axisOrder='col-major')
+            image.setColorMap(pg.colormap.get(colormap))
+            image.setRect(rect)
+            plot.addItem(image)
+            plot.setXRange(-span, 0, padding=0)
+            plot.setYRange(rect.top(), rect.bottom(), padding=0)
+            self.images.append(image)
+        plot.setLabel('bottom', 'Time (s)')
+
+    def clear(self):
+        """Blanks the history, e.g. after a playback seek, so old and new columns are never joined."""
+        self._ring.fill(np.nan)
+        self._head = 0
+        self.levels = None
+        for i, image in enumerate(self.images):
+            image.setImage(self._ring[i, :self.history], autoLevels=False, levels=(0.0, 1.0))
+
+    def push(self, columns):
+        """Appends (channels, n, bins) dB columns and redraws; the images are only re-uploaded when n > 0."""
+        columns = columns[:, -self.history:]
+        n = columns.shape[1]
+        if n == 0:
+            return
+        idx = (self._head + np.arange(n)) % self.history
+        self._ring[:, idx] = columns
+        self._ring[:, idx + self.history] = columns
+        self._head = (self._head + n) % self.history
+
+        low, high = np.percentile(columns, [2, 99.5])
+        self.levels = (low, high) if self.levels is None else \
+            (0.9 * self.levels[0] + 0.1 * low, 0.9 * self.levels[1] + 0.1 * high)
+        for i, image in enumerate(self.images):
+            image.setImage(self._ring[i, self._head:self._head + self.history], autoLevels=False, levels=self.levels)
@@ -0,0 +1,109 @@
+# stream.py
+"""
+Incremental acquisition: drains only new board samples into per-channel ring buffers.
+"""
+import time
+
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, num_rows, capacity):
+        self.capacity = capacity
+        self.data = np.zeros((num_rows, capacity))
+        self.write_pos = 0
+        self.total = 0  # samples ever written, used as a cursor by consumers
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def extend(self, block):
+        n = block.shape[1]
+        if n == 0:
+            return
+        if n >= self.capacity:
+            block = block[:, -self.capacity:]
+            self.data[:] = block
+            self.write_pos = 0
+            self.total += n
+            return
+        end = self.write_pos + n
+        if end <= self.capacity:
+            self.data[:, self.write_pos:end] = block
+        else:
+            split = self.capacity - self.write_pos
+            self.data[:, self.write_pos:] = block[:, :split]
+            self.data[:, :n - split] = block[:, split:]
+        self.write_pos = end % self.capacity
+        self.total += n
+
+    def _ordered(self, start, n):
+        if start + n <= self.capacity:
+            return self.data[:, start:start + n].copy()
+        return np.concatenate((self.data[:, start:], self.data[:, :start + n - self.capacity]), axis=1)
+
+    def latest(self, n=None):
+        available = len(self)
+        n = available if n is None else min(n, available)
+        return self._ordered((self.write_pos - n) % self.capacity, n)
+
+    def between(self, start, stop):
+        # Samples with absolute indices start..stop-1 (as counted by `total`); they must still be held.
+        return self._ordered((self.write_pos - (self.total - start)) % self.capacity, stop - start)
+
+    def oldest(self, n):
+        # The `n` samples that the next writes will overwrite first.
+        available = len(self)
+        n = min(n, available)
+        return self._ordered((self.write_pos - available) % self.capacity, n)
+
+
+class StreamBuffer:
+    """Pulls new samples from the board each tick and runs the stateful filters exactly once per sample."""
+
+    def __init__(self, board_shim, filters, montage, num_points, recorder=None):
+        self.board_shim = board_shim
+        self.recorder = recorder
+        self.filters = filters
+        self.montage = montage
+        self.num_points = num_points
+        self.buffer = RingBuffer(len(montage), num_points)
+        self.backlog = 0  # samples waiting in the board buffer at the last poll
+        # Boards that can jump (playback seeks) bump `generation`; the stream restarts when it changes.
+        self.generation = getattr(board_shim, 'generation', 0)
+
+    def poll(self, timings=None):
+        # Returns the newly ingested, real-time filtered (channels x new samples) block.
+        t0 = time.perf_counter()
+        count = self.board_shim.get_board_data_count()
+        self.backlog = max(count, 0)
+        if count <= 0:
+            self._sync_generation(getattr(self.board_shim, 'generation', 0))
+            return np.empty((len(self.montage), 0))
+        if hasattr(self.board_shim, 'read_block'):
+            generation, data = self.board_shim.read_block(count)
+        else:
+            generation, data = getattr(self.board_shim, 'generation', 0), self.board_shim.get_board_data(count)
+        self._sync_generation(generation)
+        if self.recorder is not None:
+            self.recorder.write(data)
+        t1 = time.perf_counter()
+        block = self.filters.apply_realtime_filters(self.montage.apply(data), timings=timings)
+        self.buffer.extend(block)
+        if timings is not None:
+            timings['acquire'] = t1 - t0
+            timings['rt_filter'] = time.perf_counter() - t1
+        return block
+
+    def _sync_generation(self, generation):
+        # Called with the generation the data just read belongs to, never one read separately.
+        if generation != self.generation:
+            self.generation = generation
+            self.reset()
+
+    def reset(self):
+        self.buffer = RingBuffer(len(self.montage), self.num_points)
+        self.filters.reset_realtime()
+
+    def window(self):
+        return self.buffer.latest(self.num_points)
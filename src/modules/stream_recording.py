@@ -0,0 +1,296 @@
+# stream_recording.py
+"""
+Continuous, crash-safe session recording (.eegstream) written by a background thread.
+
+Layout: 8-byte magic, uint32 header length, JSON header (as in .eegbin, plus `segment` and
+`first_sample`), padding to 64 bytes, then a sequence of blocks:
+
+    block header  '<4sB3xIIQ'  b'EEGB', codec (0 raw, 1 zlib), samples, payload bytes, first sample
+    payload       float32 (num_rows x samples), channel-major within the block, optionally zlib'd
+    block footer  '<I4s'       CRC32 of header + payload, b'BEND'
+
+A clean close appends a final block with marker b'EEGF' whose payload is a JSON summary. Every block
+is self-validating, so after a crash everything up to the last complete block is recovered; the
+reader simply stops at the first truncated or corrupt block.
+"""
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from modules.recording import build_header, read_header, timestamp_row, write_header
+
+STREAM_MAGIC = b'EEGSTR1\0'
+BLOCK = struct.Struct('<4sB3xIIQ')
+FOOTER = struct.Struct('<I4s')
+DATA_MARKER, FINAL_MARKER, END_MARKER = b'EEGB', b'EEGF', b'BEND'
+CODECS = {'none': 0, 'zlib': 1}
+_STOP = object()
+
+
+class StreamRecorder:
+    """
+    Drop-in for BinaryRecorder (`write` / `close`) that never blocks on disk I/O.
+
+    `write()` only enqueues the board block with its absolute first sample (bounded queue of
+    `queue_blocks` blocks). The writer thread gathers contiguous blocks for up to `block_seconds`,
+    converts them to float32, optionally compresses them and appends them with one write each,
+    fsyncing at most every `fsync_seconds`. With `rotate_seconds` or `rotate_bytes` the session is
+    split into numbered segment files (`name_000.eegstream`, ...), each readable on its own. When
+    the queue is full the block is dropped and counted at once rather than stalling acquisition; its
+    samples still advance the sample count, so the gap shows in the blocks' `first_sample`.
+    """
+
+    def __init__(self, path, sampling_rate, num_rows, board_id=None, board_descr=None, metadata_path=None,
+                 compression='none', rotate_seconds=None, rotate_bytes=None, block_seconds=1.0,
+                 fsync_seconds=5.0, queue_blocks=1024):
+        self.path = path
+        self.sampling_rate = sampling_rate
+        self.header = build_header(sampling_rate, num_rows, board_id, board_descr, metadata_path)
+        self.header['format'] = 'stream'
+        self.codec = CODECS[compression]
+        self.rotate_samples = int(rotate_seconds * sampling_rate) if rotate_seconds else None
+        self.rotate_bytes = rotate_bytes
+        self.block_samples = max(1, int(block_seconds * sampling_rate))
+        self.fsync_seconds = fsync_seconds
+        self.num_samples = 0  # written to disk
+        self.next_sample = 0  # absolute index of the next sample passed to write(), dropped ones included
+        self.num_blocks = 0
+        self.dropped_samples = 0
+        self.segment = -1
+        self.segment_paths = []
+        self.error = None
+        self._file = None
+        self._segment_samples = 0
+        self._end_sample = 0  # absolute index after the last written block
+        self._last_fsync = time.monotonic()
+        self._ts = timestamp_row(self.header)
+        self._queue = queue.Queue(maxsize=queue_blocks)
+        self._thread = threading.Thread(target=self._run, name='StreamRecorder', daemon=True)
+        self._thread.start()
+
+    # Acquisition side
+    def write(self, data):
+        if data.shape[1] == 0 or self._thread is None:
+            return
+        first = self.next_sample
+        self.next_sample += data.shape[1]
+        try:
+            self._queue.put_nowait((first, data))
+        except queue.Full:
+            self.dropped_samples += data.shape[1]
+            logging.error("Recorder queue full, dropped %d samples (%d in total)", data.shape[1], self.dropped_samples)
+
+    @property
+    def backlog(self):
+        return self._queue.qsize()
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self.error is not None:
+            logging.error("Recording to %s failed: %s", self.path, self.error)
+
+    # Writer thread
+    def _run(self):
+        pending, pending_first, pending_samples = [], 0, 0
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+                if item is not None and item is not _STOP:
+                    first, data = item
+                    if pending and first != pending_first + pending_samples:  # samples were dropped
+                        self._write_block(pending_first, np.concatenate(pending, axis=1))
+                        pending, pending_samples, deadline = [], 0, None
+                    if not pending:
+                        pending_first = first
+                    pending.append(data)
+                    pending_samples += data.shape[1]
+                    if deadline is None:
+                        deadline = time.monotonic() + self.block_samples / self.sampling_rate
+                if pending and (item is None or item is _STOP or pending_samples >= self.block_samples):
+                    self._write_block(pending_first, np.concatenate(pending, axis=1))
+                    pending, pending_samples, deadline = [], 0, None
+                if item is _STOP:
+                    break
+        except Exception as e:  # keep draining so acquisition never blocks on a dead writer
+            self.error = e
+            logging.exception("Recorder writer failed")
+            while self._queue.get() is not _STOP:
+                pass
+        finally:
+            self._close_segment()
+
+    def _segment_path(self, segment):
+        if self.rotate_samples is None and self.rotate_bytes is None:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}_{segment:03d}{ext or '.eegstream'}"
+
+    def _open_segment(self, first_sample):
+        self.segment += 1
+        self.header['segment'] = self.segment
+        self.header['first_sample'] = first_sample
+        path = self._segment_path(self.segment)
+        self._file = open(path, 'wb')
+        write_header(self._file, self.header, STREAM_MAGIC)
+        self._file.flush()
+        self.segment_paths.append(path)
+        self._segment_samples = 0
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        summary = json.dumps({'num_samples': self._segment_samples, 'first_sample': self.header['first_sample'],
+                              'total_samples': self.num_samples, 'dropped_samples': self.dropped_samples,
+                              'closed': time.time()}).encode('utf-8')
+        self._append(FINAL_MARKER, 0, 0, self._end_sample, summary)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _rotation_due(self):
+        if self.rotate_samples is not None and self._segment_samples >= self.rotate_samples:
+            return True
+        return self.rotate_bytes is not None and self._file.tell() >= self.rotate_bytes
+
+    def _append(self, marker, codec, num_samples, first_sample, payload):
+        head = BLOCK.pack(marker, codec, num_samples, len(payload), first_sample)
+        crc = zlib.crc32(payload, zlib.crc32(head))
+        self._file.write(b''.join((head, payload, FOOTER.pack(crc, END_MARKER))))
+
+    def _write_block(self, first_sample, data):
+        if self._file is None:
+            if self._ts is not None:
+                self.header['timestamp_offset'] = float(data[self._ts, 0])
+            self._open_segment(first_sample)
+        elif self._rotation_due():
+            self._close_segment()
+            self._open_segment(first_sample)
+
+        block = np.array(data, dtype=np.float64)
+        if self._ts is not None:
+            block[self._ts] -= self.header['timestamp_offset']
+        payload = np.ascontiguousarray(block, dtype=np.float32).tobytes()
+        if self.codec:
+            payload = zlib.compress(payload, 1)
+        self._append(DATA_MARKER, self.codec, block.shape[1], first_sample, payload)
+        self._file.flush()
+        self._end_sample = first_sample + block.shape[1]
+        self.num_samples += block.shape[1]
+        self._segment_samples += block.shape[1]
+        self.num_blocks += 1
+        if time.monotonic() - self._last_fsync >= self.fsync_seconds:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+
+class StreamReader:
+    """Validating reader for one .eegstream segment."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header, self.offset = read_header(path, STREAM_MAGIC)
+        self.num_rows = self.header['num_rows']
+        self.summary = None  # the final block's JSON, present after a clean close
+
+    def _entries(self, decode):
+        # Yields (first_sample, num_samples, data or None) for every intact data block.
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            while True:
+                head = f.read(BLOCK.size)
+                if len(head) < BLOCK.size:
+                    return
+                marker, codec, num_samples, length, first_sample = BLOCK.unpack(head)
+                if marker not in (DATA_MARKER, FINAL_MARKER):
+                    logging.warning("%s: unexpected data at byte %d, stopping", self.path, f.tell() - BLOCK.size)
+                    return
+                payload = f.read(length)
+                footer = f.read(FOOTER.size)
+                if len(payload) < length or len(footer) < FOOTER.size:
+                    logging.warning("%s: truncated block at sample %d (recording was interrupted)",
+                                    self.path, first_sample)
+                    return
+                crc, end = FOOTER.unpack(footer)
+                if end != END_MARKER or crc != zlib.crc32(payload, zlib.crc32(head)):
+                    logging.warning("%s: corrupt block at sample %d, stopping", self.path, first_sample)
+                    return
+                if marker == FINAL_MARKER:
+                    self.summary = json.loads(payload.decode('utf-8'))
+                    return
+                data = None
+                if decode:
+                    raw = zlib.decompress(payload) if codec == CODECS['zlib'] else payload
+                    data = np.frombuffer(raw, dtype=np.float32).reshape(self.num_rows, num_samples)
+                yield first_sample, num_samples, data
+
+    def scan(self):
+        """(first_sample, num_samples) of every intact block, without decoding payloads."""
+        return [(first, n) for first, n, _ in self._entries(decode=False)]
+
+    def blocks(self):
+        """Yields (first_sample, float32 (num_rows x samples)) with timestamps still relative."""
+        for first, _, data in self._entries(decode=True):
+            yield first, data
+
+
+def segment_files(path):
+    """All segments of a rotated session, in order, given any one of them (or the single file)."""
+    folder = os.path.dirname(path) or '.'
+    stem, ext = os.path.splitext(os.path.basename(path))
+    base, _, number = stem.rpartition('_')
+    if not (base and number.isdigit()):
+        return [path]
+    names = sorted(n for n in os.listdir(folder)
+                   if n.startswith(base + '_') and n.endswith(ext) and n[len(base) + 1:-len(ext)].isdigit())
+    return [os.path.join(folder, n) for n in names]
+
+
+def convert_stream(paths, out_path):
+    """
+    Joins .eegstream segments into one memory-mappable .eegbin. Blocks are placed back to back;
+    gaps (dropped or unrecoverable blocks) are reported but not padded.
+    """
+    readers = [StreamReader(p) for p in paths]
+    layout = [(r, r.scan()) for r in readers]
+    num_samples = sum(n for _, entries in layout for _, n in entries)
+    header = dict(readers[0].header)
+    for key in ('format', 'segment', 'first_sample'):
+        header.pop(key, None)
+    header['num_samples'] = num_samples
+    num_rows = header['num_rows']
+
+    with open(out_path, 'wb') as f:
+        offset = write_header(f, header)
+    if num_samples == 0:
+        return out_path, 0
+    out = np.memmap(out_path, dtype=np.float32, mode='r+', offset=offset, shape=(num_rows, num_samples))
+    pos, expected, gaps = 0, None, 0
+    for reader in readers:
+        for first, data in reader.blocks():
+            if expected is not None and first != expected:
+                gaps += 1
+                logging.warning("Gap of %d samples before sample %d", first - expected, first)
+            out[:, pos:pos + data.shape[1]] = data
+            pos += data.shape[1]
+            expected = first + data.shape[1]
+    out.flush()
+    del out
+    return out_path, gaps
+
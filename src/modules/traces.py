@@ -0,0 +1,255 @@
+# traces.py
+"""
+Time-series renderers: one plot per channel, or all channels stacked on a single canvas.
+"""
+import numpy as np
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QScrollArea
+import pyqtgraph as pg
+from pyqtgraph import ViewBox
+
+PALETTE = ['#A54E4E', '#A473B6', '#5B45A4', '#2079D2', '#32B798', '#2FA537', '#9DA52F', '#A57E2F']
+
+
+def channel_pens(montage, width=2):
+    # Derived channels are dashed blue, like the original virtual C3–C4 trace.
+    return [pg.mkPen('blue', width=width, style=Qt.DashLine) if derived
+            else pg.mkPen(PALETTE[i % len(PALETTE)], width=width)
+            for i, derived in enumerate(montage.derived)]
+
+
+def quality_text(m):
+    return (f"<span style='color:{m['color']}'>PTP: {m['ptp']:.1f} | RMS: {m['rms']:.1f} | DC: {m['dc']:.1f} | "
+            f"Flat: {m['flat']:.2f} | Kurtosis: {m['kurtosis']:.2f} | Skew: {m['skew']:.2f} | {m['status']}</span>")
+
+
+def spectral_text(m):
+    delta, theta, alpha, beta, h_beta, gamma, h_gamma = m['bands']
+    return (f"<span style='color:{m['spectral_color']}'>LNR: {m['lnr']:.2f} | MR: {m['mr']:.2f} | "
+            f"Ent: {m['entropy']:.2f} | δ: {delta:.1f} | θ: {theta:.1f} | α: {alpha:.1f} | β: {beta:.1f} | "
+            f"h-β: {h_beta:.1f} | γ: {gamma:.1f} | h-γ: {h_gamma:.1f} | {m['spectral_status']}</span>")
+
+
+class ChannelPlots:
+    """
+    One PlotWidget with two metric lines per channel, stacked in a scroll area.
+
+    Only the first channel is built up front. The others start as empty placeholders of the same
+    height and get their plot and labels the first time they scroll into view, so opening a large
+    montage costs about as much as a small one.
+    """
+
+    def __init__(self, montage, num_points, pens):
+        self.widget = QScrollArea()
+        self.widget.setWidgetResizable(True)
+        container = QWidget()
+        container_layout = QVBoxLayout()
+        container.setLayout(container_layout)
+        self.widget.setWidget(container)
+
+        self.names, self.pens, self.num_points = montage.names, pens, num_points
+        n = len(self.names)
+        self.plots, self.curves, self.labels = [None] * n, [None] * n, [None] * n
+        self.channel_widgets = []
+        for _ in range(n):
+            channel_widget = QWidget()
+            channel_widget.setLayout(QVBoxLayout())
+            container_layout.addWidget(channel_widget)
+            self.channel_widgets.append(channel_widget)
+        self._visible = [True] * n
+        self._y_range = (True, None)
+        self._build(0)
+        height = self.channel_widgets[0].sizeHint().height()
+        for channel_widget in self.channel_widgets[1:]:
+            channel_widget.setMinimumHeight(height)
+        self._shown_metrics = [None] * n
+        self._build_pending = False
+        self.connect_view_changed(self._schedule_build)
+
+    def _build(self, i):
+        plot = pg.PlotWidget()
+        plot.setXRange(0, self.num_points)
+        plot.enableAutoRange(axis='x', enable=False)
+        plot.setMaximumHeight(100)
+        plot.setLabel('left', f"{self.names[i]} (µV)")
+        plot.showGrid(y=True)
+        curve = plot.plot(pen=self.pens[i])
+        curve.setVisible(self._visible[i])
+
+        label1 = QLabel()
+        label2 = QLabel()
+        for lbl in [label1, label2]:
+            lbl.setAlignment(Qt.AlignRight)
+            lbl.setStyleSheet("font-size: 9pt")
+
+        layout = self.channel_widgets[i].layout()
+        layout.addWidget(plot)
+        layout.addWidget(label1)
+        layout.addWidget(label2)
+        self.plots[i] = plot
+        self.curves[i] = curve
+        self.labels[i] = (label1, label2)
+        self._apply_y_range(curve, *self._y_range)
+
+    def _schedule_build(self, *_):
+        # Scroll signals also fire mid-layout (e.g. on show), before the placeholders have their
+        # final positions; look at what is in view once the event loop has settled the layout.
+        if not self._build_pending:
+            self._build_pending = True
+            QTimer.singleShot(0, self._build_in_view)
+
+    def _build_in_view(self):
+        self._build_pending = False
+        for i, shown in enumerate(self.in_view()):
+            if shown and self.plots[i] is None:
+                self._build(i)
+
+    def connect_view_changed(self, slot):
+        scroll_bar = self.widget.verticalScrollBar()
+        scroll_bar.valueChanged.connect(slot)
+        scroll_bar.rangeChanged.connect(slot)
+
+    def in_view(self):
+        # Channels whose widget intersects the visible part of the scroll area.
+        top = self.widget.verticalScrollBar().value()
+        bottom = top + self.widget.viewport().height()
+        return [w.isVisibleTo(self.widget) and w.y() < bottom and w.y() + w.height() > top
+                for w in self.channel_widgets]
+
+    def set_visible(self, visible):
+        self._visible = list(visible)
+        for widget, curve, shown in zip(self.channel_widgets, self.curves, visible):
+            widget.setVisible(shown)
+            if curve is not None:
+                curve.setVisible(shown)
+
+    @staticmethod
+    def _apply_y_range(curve, auto, y_range):
+        vb = curve.getViewBox()
+        vb.enableAutoRange(ViewBox.YAxis, enable=auto)
+        if not auto and y_range is not None:
+            vb.setYRange(*y_range)
+
+    def apply_y_range(self, auto, y_range):
+        self._y_range = (auto, y_range)
+        for curve in self.curves:
+            if curve is not None:
+                self._apply_y_range(curve, auto, y_range)
+
+    def render(self, snapshot, decimator):
+        if any(shown and plot is None for shown, plot in zip(snapshot.in_view, self.plots)):
+            self._build_in_view()  # the worker's view may predate the first layout
+        for i, m in enumerate(snapshot.metrics):
+            if not snapshot.in_view[i] or self.plots[i] is None:
+                continue
+            x, y = decimator.decimate(snapshot.traces[i], self.plots[i].width())
+            self.curves[i].setData(x, y)
+            if m is None or m is self._shown_metrics[i]:
+                continue  # metrics not recomputed since the last frame
+            self._shown_metrics[i] = m
+            label1, label2 = self.labels[i]
+            label1.setText(quality_text(m))
+            if 'bands' in m:
+                label2.setText(spectral_text(m))
+
+
+class StackedTraces:
+    """
+    All channels as vertically offset curves in a single PlotItem, so large montages cost one widget
+    and one layout instead of one of each per channel.
+
+    Each trace is drawn around its own mean, one `spacing` apart; the spacing is the manual Y range
+    or, with auto range, the largest visible peak-to-peak. Channel names label the left axis and the
+    metric lines of all channels share one text panel.
+    """
+
+    def __init__(self, montage, num_points, pens):
+        self.names = montage.names
+        self.widget = QWidget()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.widget.setLayout(layout)
+
+        self.plot_widget = pg.PlotWidget()
+        self.plot = self.plot_widget.getPlotItem()
+        self.plot.setXRange(0, num_points)
+        self.plot.enableAutoRange(axis='x', enable=False)
+        self.plot.showGrid(x=True)
+        self.plot.setMouseEnabled(x=False, y=True)
+        self.curves = [self.plot.plot(pen=pen) for pen in pens]
+        layout.addWidget(self.plot_widget, stretch=4)
+
+        self.metrics_label = QLabel()
+        self.metrics_label.setStyleSheet("font-size: 8pt")
+        self.metrics_label.setTextFormat(Qt.RichText)
+        self.metrics_label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        metrics_scroll = QScrollArea()
+        metrics_scroll.setWidgetResizable(True)
+        metrics_scroll.setWidget(self.metrics_label)
+        layout.addWidget(metrics_scroll, stretch=1)
+
+        self.visible = [True] * len(self.names)
+        self._shown_metrics = None
+        self.auto = True
+        self.spacing = 200.0
+        self._offsets = {}
+        self._restack()
+
+    def _restack(self):
+        # Visible channels get consecutive slots from the top; hidden ones give theirs up.
+        shown = [i for i, v in enumerate(self.visible) if v]
+        self._offsets = {i: -slot * self.spacing for slot, i in enumerate(shown)}
+        self.plot.getAxis('left').setTicks([[(self._offsets[i], self.names[i]) for i in shown], []])
+        if shown:
+            self.plot.setYRange(-(len(shown) - 0.5) * self.spacing, 0.5 * self.spacing, padding=0)
+
+    def set_visible(self, visible):
+        self.visible = list(visible)
+        for curve, shown in zip(self.curves, visible):
+            curve.setVisible(shown)
+        self._restack()
+
+    def connect_view_changed(self, slot):
+        self.plot.vb.sigYRangeChanged.connect(slot)
+
+    def in_view(self):
+        # Channels whose line lies (at least half a spacing wide) within the visible Y range.
+        low, high = self.plot.vb.viewRange()[1]
+        half = self.spacing / 2.0
+        return [i in self._offsets and self._offsets[i] + half >= low and self._offsets[i] - half <= high
+                for i in range(len(self.names))]
+
+    def apply_y_range(self, auto, y_range):
+        self.auto = auto
+        if not auto and y_range is not None:
+            self.spacing = float(y_range[1] - y_range[0]) or self.spacing
+            self._restack()
+
+    def render(self, snapshot, decimator):
+        width = self.plot.vb.width()
+        envelopes = {}
+        for i, shown in enumerate(snapshot.in_view):
+            if shown:
+                envelopes[i] = decimator.decimate(snapshot.traces[i], width)
+
+        if self.auto and envelopes:
+            spacing = max(float(np.ptp(y)) for _, y in envelopes.values()) or self.spacing
+            if not 0.8 * self.spacing <= spacing <= 1.25 * self.spacing:
+                self.spacing = spacing
+                self._restack()
+
+        for i, (x, y) in envelopes.items():
+            self.curves[i].setData(x, y - y.mean() + self._offsets.get(i, 0.0))
+
+        if snapshot.metrics == self._shown_metrics:
+            return  # tuple of the same dicts: no channel's metrics were recomputed
+        self._shown_metrics = snapshot.metrics
+        lines = []
+        for name, m in zip(self.names, snapshot.metrics):
+            if m is None:
+                continue
+            line = f"<b>{name}</b>: {quality_text(m)}"
+            if 'bands' in m:
+                line += f"<br>&nbsp;&nbsp;{spectral_text(m)}"
+            lines.append(line)
+        self.metrics_label.setText("<br>".join(lines))
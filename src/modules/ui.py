@@ -2,10 +2,14 @@
 """
 Defines the UI control panel for EEG plot adjustments and filter settings.
 """
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QLineEdit, QPushButton, QCheckBox
+    QLineEdit, QPushButton, QCheckBox, QComboBox
 )
+import pyqtgraph as pg
+
+PSD_MODES = [("Welch (window)", 'window'), ("Incremental", 'sliding'), ("Incremental EMA", 'ema')]
 
 
 class GraphUI:
@@ -53,4 +57,77 @@ class GraphUI:
         psd_layout.addWidget(self.psd_y_auto_checkbox)
         psd_layout.addWidget(self.psd_y_apply_btn)
 
+        self.psd_mode_combo = QComboBox()
+        for label, mode in PSD_MODES:
+            self.psd_mode_combo.addItem(label, mode)
+        psd_layout.addWidget(self.psd_mode_combo)
+
         self.control_vbox.addLayout(psd_layout)
+
+
+PLAYBACK_SPEEDS = [1, 2, 5, 10, 20, 50]
+
+
+class PlaybackPanel:
+    """Speed, pause and seek controls for a PlaybackBoard, with a whole-session overview to scrub on."""
+
+    def __init__(self, board, tiles):
+        self.board = board
+        self.tiles = tiles
+        self.widget = QWidget()
+        layout = QVBoxLayout()
+
+        controls = QHBoxLayout()
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.clicked.connect(self._toggle_pause)
+        self.speed_combo = QComboBox()
+        for speed in PLAYBACK_SPEEDS:
+            self.speed_combo.addItem(f"{speed}x", speed)
+        self.speed_combo.setCurrentIndex(self._closest_speed_index(board.speed))
+        self.speed_combo.currentIndexChanged.connect(lambda _: self.board.set_speed(self.speed_combo.currentData()))
+        self.position_label = QLabel()
+        controls.addWidget(self.pause_btn)
+        controls.addWidget(QLabel("Speed:"))
+        controls.addWidget(self.speed_combo)
+        controls.addWidget(self.position_label)
+        controls.addStretch()
+
+        self.overview = pg.PlotWidget()
+        self.overview.setMaximumHeight(90)
+        self.overview.setLabel('bottom', 'Time (s)')
+        self.overview.setMouseEnabled(x=False, y=False)
+        self.overview_curve = self.overview.plot(pen=pg.mkPen('#2079D2'))
+        self.cursor = pg.InfiniteLine(pos=0, movable=True, pen=pg.mkPen('r', width=2))
+        self.cursor.sigPositionChangeFinished.connect(lambda line: self.board.seek(line.value()))
+        self.overview.addItem(self.cursor)
+        self.overview.scene().sigMouseClicked.connect(self._clicked)
+
+        layout.addLayout(controls)
+        layout.addWidget(self.overview)
+        self.widget.setLayout(layout)
+
+        x, y = self.tiles.envelope(1000)
+        self.overview_curve.setData(x, y)
+        self.overview.setXRange(0, board.duration, padding=0)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self._refresh)
+        self.timer.start(200)
+
+    @staticmethod
+    def _closest_speed_index(speed):
+        return min(range(len(PLAYBACK_SPEEDS)), key=lambda i: abs(PLAYBACK_SPEEDS[i] - speed))
+
+    def _toggle_pause(self):
+        self.board.set_paused(not self.board.paused)
+        self.pause_btn.setText("Play" if self.board.paused else "Pause")
+
+    def _clicked(self, event):
+        pos = self.overview.getPlotItem().vb.mapSceneToView(event.scenePos())
+        self.board.seek(min(max(pos.x(), 0.0), self.board.duration))
+
+    def _refresh(self):
+        position = self.board.position()
+        if not self.cursor.moving:
+            self.cursor.setValue(position)
+        self.position_label.setText(f"{position:7.1f} / {self.board.duration:.1f} s")